@@ -0,0 +1,105 @@
+# RimWorld ModSorter About.xml handling
+#
+# reads the metadata of a mod (name, packageId, dependencies etc) into a plain dict.
+import xml.etree.ElementTree as ElementTree
+from pathlib import Path
+from typing import Dict, List
+
+list_entries = ("loadAfter", "loadBefore", "incompatibleWith")
+
+
+def empty_about(name: str = "") -> Dict:
+    """
+    metadata of a mod without (readable) About.xml
+    :param name: mod name
+    :return: metadata dict
+    """
+    return {
+        "name": name,
+        "packageId": "",
+        "author": "",
+        "modDependencies": [],
+        "loadAfter": [],
+        "loadBefore": [],
+        "incompatibleWith": [],
+        "byVersion": {},
+    }
+
+
+def __text(element) -> str:
+    if element is None or element.text is None:
+        return ""
+    return element.text.strip()
+
+
+def __package_ids(element) -> List[str]:
+    if element is None:
+        return []
+    return [__text(li).lower() for li in element.findall("li") if __text(li)]
+
+
+def __dependencies(element) -> List[Dict]:
+    if element is None:
+        return []
+    dependencies = []
+    for li in element.findall("li"):
+        package_id = __text(li.find("packageId")).lower()
+        if package_id:
+            dependencies.append({"packageId": package_id, "displayName": __text(li.find("displayName"))})
+    return dependencies
+
+
+def read_about(about_xml: Path) -> Dict:
+    """
+    parses About.xml of a mod
+    :param about_xml: path to About/About.xml
+    :return: metadata dict, raises ElementTree.ParseError on malformed XML
+    """
+    root = ElementTree.parse(str(about_xml)).getroot()
+
+    about = empty_about(__text(root.find("name")))
+    about["packageId"] = __text(root.find("packageId")).lower()
+    about["author"] = __text(root.find("author"))
+    about["modDependencies"] = __dependencies(root.find("modDependencies"))
+    for entry in list_entries:
+        about[entry] = __package_ids(root.find(entry))
+
+    # version specific entries, e.g. <modDependenciesByVersion><v1.2>...
+    for entry in ("modDependencies",) + list_entries:
+        by_version = root.find(f"{entry}ByVersion")
+        if by_version is None:
+            continue
+        for version in by_version:
+            version_entries = about["byVersion"].setdefault(version.tag.lstrip("vV"), {})
+            if entry == "modDependencies":
+                version_entries[entry] = __dependencies(version)
+            else:
+                version_entries[entry] = __package_ids(version)
+    return about
+
+
+def major_minor(rimworld_version: str) -> str:
+    """
+    major and minor part of a RimWorld version, as used for version subfolders and byVersion entries
+    :param rimworld_version: RimWorld version (e.g. "1.2.2753 rev1097")
+    :return: e.g. "1.2"
+    """
+    return ".".join(rimworld_version.split(" ")[0].split(".")[:2])
+
+
+def version_entries(about: Dict, entry: str, rimworld_version: str) -> List:
+    """
+    entries of a mod for a RimWorld version, generic plus version specific ones
+    :param about: metadata dict
+    :param entry: entry name, e.g. "modDependencies"
+    :param rimworld_version: RimWorld version (e.g. "1.2.2753 rev1097"), "unknown" for generic entries only
+    :return: list of entries
+    """
+    return about[entry] + about["byVersion"].get(major_minor(rimworld_version), {}).get(entry, [])
+
+
+# debug
+if __name__ == "__main__":
+    import sys
+
+    print(read_about(Path(sys.argv[1])))
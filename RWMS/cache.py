@@ -0,0 +1,184 @@
+# RimWorld ModSorter cache module
+#
+# small JSON based files which are kept between runs (memo, parse caches). caches which do not depend on
+# the user (downloads, parse caches of mod folders) can be kept in a shared cache directory, which several
+# users of one host use together. writes are done under a file lock and by atomic replace, so concurrent
+# runs never read a partially written file.
+import contextlib
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Callable
+
+import RWMS.configuration
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+lock_suffix = ".lock"
+
+
+def __current_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# temporary files are created with mode 0600, files in the shared cache have to be readable by other users
+shared_mode = 0o666 & ~__current_umask()
+
+
+def cache_dir(shared: bool = False) -> Path:
+    """
+    cache directory
+    :param shared: the shared cache directory, falls back to the user cache directory if none is configured
+    :return: path
+    """
+    if shared:
+        shared_dir = RWMS.configuration.detect_shared_cachedir()
+        if shared_dir is not None:
+            return shared_dir
+    return RWMS.configuration.detect_cachedir()
+
+
+def cache_file(name: str, shared: bool = False) -> Path:
+    """
+    full path of a cache file
+    :param name: file name inside the cache directory
+    :param shared: file in the shared cache directory
+    :return: path
+    """
+    return cache_dir(shared) / name
+
+
+def is_writable(shared: bool = False) -> bool:
+    """
+    checks if the cache directory can be written, a shared cache directory may be read-only for some users
+    :param shared: shared cache directory
+    :return: True if writable
+    """
+    directory = cache_dir(shared)
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        return False
+    return os.access(str(directory), os.W_OK)
+
+
+@contextlib.contextmanager
+def file_lock(path: Path):
+    """
+    exclusive lock for a cache file (on a separate lock file), blocks until the lock is acquired
+    :param path: cache file
+    """
+    lock_name = str(path) + lock_suffix
+    try:
+        fd = os.open(lock_name, os.O_RDWR | os.O_CREAT, 0o666)
+    except PermissionError:
+        # lock file of another user in the shared cache directory
+        fd = os.open(lock_name, os.O_RDONLY)
+    try:
+        if sys.platform == "win32":
+            # retries for about 10 seconds, then raises OSError
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        if sys.platform == "win32":
+            with contextlib.suppress(OSError):
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        # closing the file releases the lock on POSIX
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def replacing(name: str, shared: bool = False):
+    """
+    writes a cache file to a temporary file and replaces the cache file atomically when the with block
+    succeeds, on errors the old cache file stays untouched
+    :param name: file name inside the cache directory
+    :param shared: file in the shared cache directory
+    :return: binary file object
+    """
+    target = cache_file(name, shared)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{name}.", dir=str(target.parent))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        if shared:
+            os.chmod(tmp_name, shared_mode)
+        os.replace(tmp_name, str(target))
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_name)
+        raise
+
+
+def __write_failed(target: Path, error: OSError, shared: bool):
+    # a cache is an optimization, never fail the run because of it. read-only shared caches are fine.
+    if not (shared and isinstance(error, PermissionError)):
+        print(f"** warning: could not write cache file {target}: {error}")
+
+
+def load_json(name: str, default: Any, shared: bool = False) -> Any:
+    """
+    loads a JSON cache file, returns default if it does not exist or is unreadable
+    :param name: file name inside the cache directory
+    :param default: value returned on a cache miss
+    :param shared: file in the shared cache directory
+    :return: cached data
+    """
+    try:
+        with open(cache_file(name, shared), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(name: str, data: Any, shared: bool = False):
+    """
+    atomically writes a JSON cache file, a concurrent reader sees either the old or the new file
+    :param name: file name inside the cache directory
+    :param data: data to write
+    :param shared: file in the shared cache directory
+    """
+    target = cache_file(name, shared)
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(target), replacing(name, shared) as f:
+            f.write(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+    except OSError as e:
+        __write_failed(target, e, shared)
+
+
+def update_json(name: str, default: Any, update: Callable[[Any], None], shared: bool = False):
+    """
+    changes a JSON cache file under its lock, changes of concurrent runs in between are not lost
+    :param name: file name inside the cache directory
+    :param default: value used if the file does not exist or is unreadable
+    :param update: function which changes the loaded data in place
+    :param shared: file in the shared cache directory
+    """
+    target = cache_file(name, shared)
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(target):
+            data = load_json(name, default, shared)
+            update(data)
+            with replacing(name, shared) as f:
+                f.write(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+    except OSError as e:
+        __write_failed(target, e, shared)
+
+
+# debug
+if __name__ == "__main__":
+    print(RWMS.configuration.detect_cachedir())
+    print(RWMS.configuration.detect_shared_cachedir())
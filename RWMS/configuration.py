@@ -30,12 +30,13 @@ def configuration_file() -> Path:
     # return os.path.join(mypath, "rwms_config.ini")
 
 
-def load_value(section, entry, is_bool=False) -> Union[str, bool]:
+def load_value(section, entry, is_bool=False, default=None) -> Union[str, bool]:
     """
     loads a value from the configurator
     :param section: configuration file section
     :param entry: entry
     :param is_bool: optional, if it is a boolean switch
+    :param default: optional, value used if the entry is missing (for entries newer than the user's configuration)
     :return: value
     """
     configfile = configuration_file()
@@ -51,6 +52,9 @@ def load_value(section, entry, is_bool=False) -> Union[str, bool]:
         input("Press ENTER to end program.")
         sys.exit(1)
 
+    if default is not None and not cfg.has_option(section, entry):
+        return default
+
     try:
         if is_bool:
             value = cfg.getboolean(section, entry)
@@ -144,6 +148,14 @@ def detect_rimworld_configdir() -> Path:
     return rimworld_config_dir
 
 
+def detect_rimworld_savedir() -> Path:
+    """
+    detects RimWorld savegame directory (sibling of the configuration directory)
+    :return: path to RimWorld savegames
+    """
+    return Path(detect_rimworld_configdir()).parent / "Saves"
+
+
 def detect_steamworkshop_dir() -> Optional[Path]:
     """
     detects steamworkshop directory if steam version
@@ -178,6 +190,43 @@ def detect_localmods_dir() -> Optional[Path]:
         return None
 
 
+def detect_cachedir() -> Path:
+    """
+    detects the cache directory of RWMS (memo, parse caches)
+    :return: path to cache directory
+    """
+    cache_dir = load_value("paths", "cachedir", default="")
+    if cache_dir == "":
+        if sys.platform == "win32":
+            cache_dir = Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData/Local")) / "RWMS"
+        elif sys.platform == "darwin":
+            cache_dir = Path.home() / "Library/Caches/RWMS"
+        else:
+            cache_dir = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "rwms"
+    else:
+        cache_dir = Path(cache_dir)
+    return cache_dir
+
+
+def detect_shared_cachedir() -> Optional[Path]:
+    """
+    detects the cache directory shared by several users of one host (downloads, parse caches)
+    :return: path to shared cache directory, None if not configured
+    """
+    shared_dir = load_value("paths", "sharedcachedir", default="")
+    if shared_dir == "":
+        return None
+    return Path(shared_dir)
+
+
+def tweaks_dir() -> Path:
+    """
+    directory of the user tweak files
+    :return: path to tweaks directory
+    """
+    return configuration_file().parent / "tweaks"
+
+
 def modsconfigfile() -> Path:
     """
     ModsConfig.xml
@@ -227,6 +276,9 @@ def __dump_configuration():
     print(f"RimWorld configuration folder ...: {__check_dir(detect_rimworld_configdir())}")
     print(f"RimWorld local mods folder ......: {__check_dir(detect_localmods_dir())}")
     print(f"RimWorld steam workshop folder ..: {__check_dir(detect_steamworkshop_dir())}")
+    print(f"RWMS cache folder ...............: {__check_dir(detect_cachedir())}")
+    if detect_shared_cachedir() is not None:
+        print(f"RWMS shared cache folder ........: {__check_dir(detect_shared_cachedir())}")
 
     if modsconfigfile() != "":
         print(f"RimWorld ModsConfig.xml .........: {__check_file(modsconfigfile())}\n")
@@ -1,24 +1,134 @@
 # RimWorld database handling stuff
+import codecs
+import collections
+import gzip
+import hashlib
 import json
+import re
+import shutil
 import sys
-from typing import Dict
-from urllib.request import urlopen
+import time
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import urljoin
+from urllib.request import Request, urlopen
 
+import RWMS.cache
 import RWMS.configuration
 import RWMS.error
 
-wait_on_error = RWMS.configuration.load_value("rwms", "waitforkeypress_on_error", True)
+upstream_database_url = "https://api.bitbucket.org/2.0/repositories/shakeyourbunny/rwmsdb/src/master/rwmsdb.json"
+# the categories are expected next to the database
+categories_name = "rwms_db_categories.json"
+
+chunk_size = 64 * 1024
+# "key": "value" pair of an object, followed by its delimiter
+string_pair_regex = re.compile(r'\s*"((?:[^"\\]|\\.)*)"\s*:\s*("(?:[^"\\]|\\.)*")\s*([,}])')
+
+# downloads are kept in the (shared) cache, a download younger than this is used without asking the server
+downloads_name = "rwms_downloads.json"
+download_max_age = 600
+request_timeout = 60
+# hits and misses of the download cache and downloaded bytes of this run (see RWMS.metrics)
+cache_stats = {"hits": 0, "misses": 0, "bytes": 0}
+
+
+def database_urls() -> Tuple[str, str]:
+    """
+    URLs of the categories and the database, database_url in the configuration file points to a mirror
+    :return: (categories URL, database URL)
+    """
+    database_url = RWMS.configuration.load_value("rwms", "database_url", default="") or upstream_database_url
+    return urljoin(database_url, categories_name), database_url
+
+
+def __download_name(url: str) -> str:
+    return f"rwms_download_{hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]}.json"
+
+
+def open_download(url: str) -> BinaryIO:
+    """
+    opens a download, from the (shared) cache if it is recent or unchanged on the server. one run downloads
+    at a time, concurrent runs wait for it and use the cached file then.
+    :param url: URL
+    :return: binary file object
+    """
+    name = __download_name(url)
+    cached = RWMS.cache.cache_file(name, shared=True)
+    entry = RWMS.cache.load_json(downloads_name, {}, shared=True).get(url)
+    if entry is not None and cached.is_file() and time.time() - entry["time"] < download_max_age:
+        cache_stats["hits"] += 1
+        return open(str(cached), "rb")
+    if not RWMS.cache.is_writable(shared=True):
+        cache_stats["misses"] += 1
+        return urlopen(url, timeout=request_timeout)
+
+    with RWMS.cache.file_lock(cached):
+        # another run may have downloaded it while waiting for the lock
+        entry = RWMS.cache.load_json(downloads_name, {}, shared=True).get(url)
+        if entry is not None and cached.is_file() and time.time() - entry["time"] < download_max_age:
+            cache_stats["hits"] += 1
+            return open(str(cached), "rb")
+
+        has_copy = entry is not None and cached.is_file()
+        headers = {"Accept-Encoding": "gzip"}
+        if has_copy:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            with urlopen(Request(url, headers=headers), timeout=request_timeout) as response:
+                with RWMS.cache.replacing(name, shared=True) as f:
+                    if response.headers.get("Content-Encoding") == "gzip":
+                        shutil.copyfileobj(gzip.GzipFile(fileobj=response), f, chunk_size)
+                    else:
+                        shutil.copyfileobj(response, f, chunk_size)
+                    cache_stats["bytes"] += int(response.headers.get("Content-Length") or f.tell())
+                cache_stats["misses"] += 1
+                entry = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+        except OSError as e:
+            if isinstance(e, HTTPError) and e.code == 304:
+                print(f"{url} is unchanged, using the cached copy.")
+                cache_stats["hits"] += 1
+            elif has_copy:
+                print(f"** warning: could not download {url} ({e}), using the cached copy.")
+                cache_stats["hits"] += 1
+                return open(str(cached), "rb")
+            else:
+                raise
+        entry["time"] = time.time()
+        RWMS.cache.update_json(downloads_name, {}, lambda index: index.update({url: entry}), shared=True)
+    return open(str(cached), "rb")
+
+
+def download_stamp(url: str) -> Optional[str]:
+    """
+    change stamp of a download without reading it, the cached copy is refreshed first if it is outdated
+    :param url: URL
+    :return: stamp of the cached copy, None if it cannot be cached or downloaded
+    """
+    cached = RWMS.cache.cache_file(__download_name(url), shared=True)
+    try:
+        with open_download(url) as f:
+            if getattr(f, "name", None) != str(cached):
+                # read-only cache directory, only the downloaded data itself tells if it changed
+                return None
+        stat = cached.stat()
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
 
 
 # download most recent DB
-def download_database(url: str) -> Dict:
+def download_database(url: str, wait_on_error: bool = True) -> Dict:
     print("loading database.")
     if url == "":
         RWMS.error.fatal_error("no database URL defined.", wait_on_error)
         sys.exit(1)
 
     try:
-        with urlopen(url) as json_url:
+        with open_download(url) as json_url:
             json_data = json_url.read()
     except:
         RWMS.error.fatal_error(f"could not open {url}", wait_on_error)
@@ -34,3 +144,191 @@ def download_database(url: str) -> Dict:
             sys.exit(1)
 
     return db
+
+
+class JSONStreamReader:
+    """
+    minimal incremental reader for a JSON object, reads the stream in chunks and decodes one
+    value at a time, so that big objects can be filtered without holding the whole document.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size: int = chunk_size) -> bool:
+        if self.eof:
+            return False
+        data = self.stream.read(size)
+        self.eof = not data
+        self.buffer = self.buffer[self.pos :] + self.decoder.decode(data, final=self.eof)
+        self.pos = 0
+        return not self.eof
+
+    def peek(self) -> str:
+        """next non whitespace character, empty at the end of the stream"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos : self.pos + 1]
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"expected '{char}' at stream position {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        """decodes the next JSON value"""
+        self.peek()
+        size = chunk_size
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+                # a number or literal ending exactly at the buffer end may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # big values: read ahead in growing steps, not every chunk decodes the value again
+            self.fill(size)
+            size *= 2
+
+    def items(self):
+        """iterates over the (key, value) pairs of the next JSON object"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key, self
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"expected ',' or '}}' at stream position {self.pos}")
+
+    def filtered_object(self, keep: Callable[[str], bool]) -> Tuple[Dict, int]:
+        """
+        decodes the next JSON object, keeping only entries whose key is accepted by keep. string values
+        are matched directly in the buffer and only decoded if they are kept.
+        :param keep: filter function by key
+        :return: kept entries and the number of all entries
+        """
+        entries = dict()
+        count = 0
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return entries, count
+        match_pair = string_pair_regex.match
+        while True:
+            match = match_pair(self.buffer, self.pos)
+            if match is None and not self.eof and len(self.buffer) - self.pos < 4096:
+                # the entry may continue in the next chunk
+                self.fill()
+                match = match_pair(self.buffer, self.pos)
+            if match:
+                raw_key, raw_value, delimiter = match.groups()
+                self.pos = match.end()
+                key = json.loads(f'"{raw_key}"') if "\\" in raw_key else raw_key
+                if keep(key):
+                    entries[key] = json.loads(raw_value)
+            else:
+                # non string value or very long entry
+                key = self.value()
+                self.expect(":")
+                value = self.value()
+                if keep(key):
+                    entries[key] = value
+                delimiter = self.peek()
+                self.pos += 1
+            count += 1
+            if delimiter == "}":
+                return entries, count
+            if delimiter != ",":
+                raise ValueError(f"expected ',' or '}}' at stream position {self.pos}")
+
+
+def __read_referenced(url: str, referenced: Dict[str, set], db: Dict):
+    """
+    second pass over the (cached) download for entries referenced by a section which came after them
+    """
+    with open_download(url) as json_url:
+        reader = JSONStreamReader(json_url)
+        for section, _ in reader.items():
+            if reader.peek() != "{":
+                reader.value()
+                continue
+            entries, _ = reader.filtered_object(referenced.get(section, set()).__contains__)
+            db.setdefault(section, {}).update(entries)
+
+
+def stream_database(
+    url: str,
+    filters: Dict[str, Callable[[str], bool]],
+    wait_on_error: bool = True,
+    references: Optional[Dict[str, str]] = None,
+) -> Dict:
+    """
+    loads the database, entries of the sections given in filters are only kept if the filter accepts their
+    key; everything else (version, timestamp, contributor counts) is loaded as it is.
+    :param url: database URL
+    :param filters: section -> function which decides by key if an entry is kept
+    :param wait_on_error: wait for a keypress on errors
+    :param references: section -> section its values are keys of, e.g. "packageid" -> "db". the entries
+                       referenced by kept entries are kept as well, in whatever order the sections come.
+    :return: database, with "<section>_entries" holding the unfiltered number of entries per filtered section
+    """
+    print("loading database.")
+    if url == "":
+        RWMS.error.fatal_error("no database URL defined.", wait_on_error)
+        sys.exit(1)
+
+    try:
+        json_url = open_download(url)
+    except:
+        RWMS.error.fatal_error(f"could not open {url}", wait_on_error)
+        sys.exit(1)
+
+    references = references or {}
+    # section -> keys referenced by kept entries of other sections, before / after the section was read
+    referenced = collections.defaultdict(set)
+    referenced_late = collections.defaultdict(set)
+
+    def keep(section):
+        return lambda key: filters[section](key) or key in referenced[section]
+
+    db = dict()
+    with json_url:
+        try:
+            reader = JSONStreamReader(json_url)
+            for section, _ in reader.items():
+                if section not in filters:
+                    db[section] = reader.value()
+                    continue
+                db[section], db[f"{section}_entries"] = reader.filtered_object(keep(section))
+                target = references.get(section)
+                if target is None:
+                    continue
+                keys = {value for value in db[section].values() if isinstance(value, str)}
+                if target in db:
+                    referenced_late[target].update(keys - db[target].keys())
+                else:
+                    referenced[target].update(keys)
+            if referenced_late:
+                __read_referenced(url, referenced_late, db)
+        except:
+            RWMS.error.fatal_error("Could not load data from RWMSDB repository.", wait_on_error)
+            sys.exit(1)
+
+    return db
@@ -0,0 +1,201 @@
+# RimWorld ModSorter Defs module
+#
+# scans Defs/ and Patches/ of the active mods for defNames which are defined or patched by more than
+# one mod. files are parsed streaming in a process pool, results are cached per mod by file mtimes.
+import hashlib
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import RWMS.about
+import RWMS.cache
+
+cache_name = "rwms_defs_cache.json"
+cache_stats = {"hits": 0, "misses": 0}
+version_folder_regex = re.compile(r"^v?\d+\.\d+$")
+# Defs/ThingDef[defName="Steel" or defName="Gold"]
+xpath_step_regex = re.compile(r"(\w+)\s*\[([^\]]*)\]")
+xpath_defname_regex = re.compile(r"defName\s*=\s*[\"']([^\"']+)[\"']")
+
+
+def __load_folders(mod_folder: Path, major_minor: str) -> List[str]:
+    load_folders_xml = mod_folder / "LoadFolders.xml"
+    if not load_folders_xml.is_file():
+        return []
+    try:
+        root = ElementTree.parse(str(load_folders_xml)).getroot()
+    except ElementTree.ParseError:
+        return []
+    for version in root:
+        if version.tag.lstrip("vV") == major_minor:
+            return [(li.text or "").strip().strip("/\\") for li in version.findall("li")]
+    return []
+
+
+def content_folders(mod_folder: Path, rimworld_version: str) -> List[Path]:
+    """
+    folders of a mod which RimWorld loads content from, honoring LoadFolders.xml and version subfolders
+    :param mod_folder: mod folder
+    :param rimworld_version: RimWorld version (e.g. "1.2.2753 rev1097")
+    :return: list of folders
+    """
+    major_minor = RWMS.about.major_minor(rimworld_version)
+    load_folders = __load_folders(mod_folder, major_minor)
+    if load_folders:
+        return [mod_folder / folder if folder else mod_folder for folder in load_folders]
+
+    folders = [mod_folder, mod_folder / "Common"]
+    try:
+        versions = sorted(
+            (entry.name for entry in os.scandir(str(mod_folder)) if version_folder_regex.match(entry.name)),
+            key=lambda name: tuple(int(part) for part in name.lstrip("v").split(".")),
+        )
+    except OSError:
+        versions = []
+    matching = [version for version in versions if version.lstrip("v") == major_minor]
+    if matching:
+        folders.append(mod_folder / matching[0])
+    elif versions:
+        # unknown RimWorld version, assume the newest one
+        folders.append(mod_folder / versions[-1])
+    return [folder for folder in folders if folder.is_dir()]
+
+
+def __xml_files(folders: List[Path]) -> List[Tuple[str, str]]:
+    files = []
+    for folder in folders:
+        for kind in ("Defs", "Patches"):
+            for dirpath, _, filenames in os.walk(str(folder / kind)):
+                files += [(kind, os.path.join(dirpath, name)) for name in filenames if name.lower().endswith(".xml")]
+    return sorted(files)
+
+
+def __signature(files: List[Tuple[str, str]]) -> str:
+    digest = hashlib.sha1()
+    for _, file_name in files:
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            continue
+        digest.update(f"{file_name}:{stat.st_mtime_ns}:{stat.st_size};".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def __scan_defs(file_name: str, defs: set):
+    depth = 0
+    def_type = None
+    for event, element in ElementTree.iterparse(file_name, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if depth == 2:
+                def_type = element.tag
+            continue
+        depth -= 1
+        if depth == 2 and element.tag == "defName" and element.text:
+            defs.add((def_type, element.text.strip()))
+        elif depth == 1:
+            element.clear()
+
+
+def __scan_patches(file_name: str, patches: set):
+    for _, element in ElementTree.iterparse(file_name, events=("end",)):
+        if element.tag == "xpath" and element.text:
+            for def_type, condition in xpath_step_regex.findall(element.text):
+                for def_name in xpath_defname_regex.findall(condition):
+                    patches.add((def_type, def_name))
+        elif element.tag in ("Operation", "li"):
+            element.clear()
+
+
+def scan_files(files: List[Tuple[str, str]]) -> Dict[str, List]:
+    """
+    scans the Defs and Patches files of one mod (runs in a worker process)
+    :param files: list of ("Defs" | "Patches", file name)
+    :return: dict with lists of [def type, defName] for "defs" and "patches"
+    """
+    defs = set()
+    patches = set()
+    for kind, file_name in files:
+        try:
+            if kind == "Defs":
+                __scan_defs(file_name, defs)
+            else:
+                __scan_patches(file_name, patches)
+        except (ElementTree.ParseError, OSError):
+            # RimWorld skips broken files too
+            continue
+    return {"defs": sorted(defs), "patches": sorted(patches)}
+
+
+def scan_mods(mods: Dict[str, Path], rimworld_version: str) -> Dict[str, Dict[str, List]]:
+    """
+    scans Defs and Patches of several mods, only mods with changed files are parsed again
+    :param mods: mod_id -> mod folder
+    :param rimworld_version: RimWorld version
+    :return: mod_id -> scan result (see scan_files)
+    """
+    cache = RWMS.cache.load_json(cache_name, {}, shared=True)
+    results = {}
+    todo = {}
+    for mod_id, mod_folder in mods.items():
+        files = __xml_files(content_folders(mod_folder, rimworld_version))
+        signature = __signature(files)
+        cached = cache.get(str(mod_folder))
+        if cached is not None and cached["signature"] == signature:
+            results[mod_id] = cached
+        else:
+            todo[mod_id] = (files, signature)
+    cache_stats["hits"] += len(results)
+    cache_stats["misses"] += len(todo)
+
+    if todo:
+        print(f"Scanning Defs and Patches of {len(todo)} mods ({len(results)} cached).")
+        if len(todo) > 2:
+            with ProcessPoolExecutor() as pool:
+                scanned = dict(zip(todo, pool.map(scan_files, [files for files, _ in todo.values()], chunksize=4)))
+        else:
+            scanned = {mod_id: scan_files(files) for mod_id, (files, _) in todo.items()}
+        for mod_id, result in scanned.items():
+            result["signature"] = todo[mod_id][1]
+            results[mod_id] = result
+        changed = {str(mods[mod_id]): scanned[mod_id] for mod_id in scanned}
+        RWMS.cache.update_json(cache_name, {}, lambda current: current.update(changed), shared=True)
+    return results
+
+
+def find_conflicts(load_order: List[str], scans: Dict[str, Dict[str, List]]) -> List[Dict]:
+    """
+    finds pairs of mods which define or patch the same defs
+    :param load_order: mod ids in load order
+    :param scans: scan results per mod id
+    :return: list of conflicts (dicts with "mods", "winner", "kind", "defs"), biggest first
+    """
+    # (def type, defName) -> {mod_id: "def" | "patch"} in load order, a definition outweighs a patch
+    index = {}
+    for mod_id in load_order:
+        scan = scans.get(mod_id)
+        if scan is None:
+            continue
+        for def_type, def_name in scan["patches"]:
+            index.setdefault((def_type, def_name), {})[mod_id] = "patch"
+        for def_type, def_name in scan["defs"]:
+            index.setdefault((def_type, def_name), {})[mod_id] = "def"
+
+    pairs = {}
+    for def_key, touched in index.items():
+        if len(touched) < 2:
+            continue
+        touched = list(touched.items())
+        for i, (mod_a, kind_a) in enumerate(touched):
+            for mod_b, kind_b in touched[i + 1 :]:
+                kind = "override" if kind_a == kind_b == "def" else "patch"
+                # patches are applied after all Defs are loaded, between equals the later loaded mod wins
+                winner = mod_a if kind_a == "patch" and kind_b == "def" else mod_b
+                conflict = pairs.setdefault(
+                    (mod_a, mod_b, kind, winner), {"mods": (mod_a, mod_b), "winner": winner, "kind": kind, "defs": []}
+                )
+                conflict["defs"].append(f"{def_key[0]}/{def_key[1]}")
+    return sorted(pairs.values(), key=lambda conflict: len(conflict["defs"]), reverse=True)
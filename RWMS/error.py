@@ -3,8 +3,13 @@
 # encapsulates error handling
 import sys
 
+# message of the last fatal error (reported in the JSON result)
+last_error = None
+
 
 def fatal_error(message, wait=True):
+    global last_error
+    last_error = message
     print(f"*** fatal error: {message}\n")
     if wait:
         input("Press ENTER to terminate the program.")
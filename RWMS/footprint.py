@@ -0,0 +1,124 @@
+# RimWorld ModSorter footprint module
+#
+# estimates the load cost of mods by their size on disk, textures, Defs, assemblies and patches.
+# folders are scanned in a bounded thread pool, results are cached per mod folder by a content signature.
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+import RWMS.cache
+
+cache_name = "rwms_footprint_cache.json"
+cache_stats = {"hits": 0, "misses": 0}
+texture_extensions = (".png", ".dds", ".jpg", ".jpeg", ".tga", ".psd")
+max_workers = min(16, (os.cpu_count() or 1) * 4)
+
+# keys of a footprint, in report order
+footprint_keys = ("bytes", "textures", "texture_bytes", "defs_bytes", "assemblies", "assembly_bytes", "patches")
+
+
+def folder_signature(mod_folder: Path) -> str:
+    """
+    content signature of a mod folder, changes when any file below it is added, removed or changed
+    :param mod_folder: mod folder
+    :return: hex digest
+    """
+    digest = hashlib.sha1()
+    for dirpath, dirnames, filenames in os.walk(str(mod_folder)):
+        dirnames.sort()
+        for name in sorted(filenames):
+            file_name = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(file_name, follow_symlinks=False)
+            except OSError:
+                continue
+            digest.update(f"{file_name}:{stat.st_mtime_ns}:{stat.st_size};".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def __walk(path: str, footprint: Dict[str, int], in_defs: bool, in_patches: bool):
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            name = entry.name.lower()
+            __walk(entry.path, footprint, in_defs or name == "defs", in_patches or name == "patches")
+            continue
+        try:
+            size = entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+        name = entry.name.lower()
+        footprint["bytes"] += size
+        if name.endswith(texture_extensions):
+            footprint["textures"] += 1
+            footprint["texture_bytes"] += size
+        elif name.endswith(".dll"):
+            footprint["assemblies"] += 1
+            footprint["assembly_bytes"] += size
+        elif name.endswith(".xml"):
+            if in_defs:
+                footprint["defs_bytes"] += size
+            elif in_patches:
+                try:
+                    with open(entry.path, "rb") as f:
+                        footprint["patches"] += f.read().count(b'Class="PatchOperation')
+                except OSError:
+                    pass
+
+
+def scan_folder(mod_folder: Path) -> Dict[str, int]:
+    """
+    computes the footprint of a mod folder
+    :param mod_folder: mod folder
+    :return: dict with the footprint_keys
+    """
+    footprint = dict.fromkeys(footprint_keys, 0)
+    __walk(str(mod_folder), footprint, False, False)
+    return footprint
+
+
+def footprints(mods: Dict[str, Path], stamps: Optional[Dict[str, str]] = None) -> Dict[str, Dict[str, int]]:
+    """
+    footprints of several mods, unchanged folders are taken from the cache
+    :param mods: mod_id -> mod folder
+    :param stamps: mod_id -> change stamp of the whole mod (workshop manifest), other mods are signed by their files
+    :return: mod_id -> footprint
+    """
+    cache = RWMS.cache.load_json(cache_name, {}, shared=True)
+    stamps = stamps or {}
+
+    def lookup(mod_id):
+        mod_folder = mods[mod_id]
+        stamp = stamps.get(mod_id) or folder_signature(mod_folder)
+        cached = cache.get(str(mod_folder))
+        if cached is not None and cached["stamp"] == stamp:
+            return cached["footprint"], False
+        return {"stamp": stamp, "footprint": scan_folder(mod_folder)}, True
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        scanned = dict(zip(mods, pool.map(lookup, mods)))
+
+    results = {}
+    changed = {}
+    for mod_id, (result, scanned_now) in scanned.items():
+        if scanned_now:
+            changed[str(mods[mod_id])] = result
+            result = result["footprint"]
+        results[mod_id] = result
+    cache_stats["hits"] += len(results) - len(changed)
+    cache_stats["misses"] += len(changed)
+    if changed:
+        RWMS.cache.update_json(cache_name, {}, lambda current: current.update(changed), shared=True)
+    return results
+
+
+def human_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
@@ -0,0 +1,167 @@
+# RimWorld ModSorter mod identity module
+#
+# resolves installed mods to database entries: by packageId first, then by Steam workshop ID, then by
+# the packageId / workshop ID learned from earlier runs and last by the cleaned up mod name. every step
+# is a lookup in a prebuilt index.
+import re
+from typing import Callable, Dict, Optional, Tuple
+
+import RWMS.cache
+
+cache_name = "rwms_identity.json"
+# database sections which map a key to a mod name of the "db" section
+database_references = {"packageid": "db", "workshopid": "db"}
+tiers = ("packageid", "workshopid", "learned", "name")
+
+# version garbage in mod names, e.g. "v1.2.3", "[1.0]", "(B19)", "for 1.0"
+garbage_name_regex = re.compile(
+    r"(v|V|)\d+\.\d+(\.\d+|)([a-z]|)|\[(1.0|(A|B)\d+)\]|\((1.0|(A|B)\d+)\)|(for |R|)(1.0|(A|B)\d+)|\.1(8|9)"
+)
+
+
+# functions - cleanup_garbage_name(garbage_name)
+def cleanup_garbage_name(garbage_name: str) -> str:
+    clean = garbage_name
+    clean = garbage_name_regex.sub("", clean)
+    clean = garbage_name_regex.sub("", clean)
+    clean = clean.replace(" - ", ": ").replace(" : ", ": ")
+    #
+    clean = clean.replace("  ", " ")
+    clean = " ".join(clean.split()).strip()
+
+    # cleanup ruined names
+    clean = clean.replace("()", "")
+    clean = clean.replace("[]", "")
+
+    # special cases
+    clean = clean.replace("(v. )", "")  # Sora's RimFantasy: Brutal Start (v. )
+    if clean.endswith(" Ver"):
+        clean = clean.replace(" Ver", "")  # Starship Troopers Arachnids Ver
+    if clean.endswith(" %"):
+        clean = clean.replace(" %", "")  # Tilled Soil (Rebalanced): %
+    if clean.find("[ "):
+        clean = clean.replace("[ ", "[")  # Additional Traits [ Update]
+    if clean.find("( & b19)"):
+        clean = clean.replace("( & b19)", "")  # Barky's Caravan Dogs ( & b19)
+    if clean.find("[19]"):
+        clean = clean.replace("[19]", "")  # Sailor Scouts Hair [19]
+    if clean.find("[/] Version"):
+        clean = clean.replace("[/] Version", "")  # Fueled Smelter [/] Version
+
+    if clean.endswith(":"):
+        clean = clean[:-1]
+    if clean.startswith(": "):
+        clean = clean[2:]  # : ACP: More Floors Wool Patch
+    if clean.startswith("-"):
+        clean = clean[1:]  # -FuelBurning
+
+    clean = clean.strip()
+
+    return clean
+
+
+def build_index(database: Dict) -> Dict[str, Dict[str, str]]:
+    """
+    builds the lookup indexes over the database, packageIds and workshop IDs come from the optional
+    "packageid" and "workshopid" sections of the database, the learned ones from mods resolved by name
+    on earlier runs
+    :param database: loaded database
+    :return: dict of indexes, each maps a key to the mod name in the database
+    """
+    mods = database["db"]
+    learned = RWMS.cache.load_json(cache_name, {"packageid": {}, "workshopid": {}}, shared=True)
+    packageids = {k.lower(): v for k, v in database.get("packageid", {}).items()}
+    return {
+        "packageid": {key: name for key, name in packageids.items() if name in mods},
+        "workshopid": {key: name for key, name in database.get("workshopid", {}).items() if name in mods},
+        "learned_packageid": {key: name for key, name in learned["packageid"].items() if name in mods},
+        "learned_workshopid": {key: name for key, name in learned["workshopid"].items() if name in mods},
+        # exact names win over case insensitive matches
+        "name": {**{name.casefold(): name for name in mods}, **{name: name for name in mods}},
+    }
+
+
+def database_filters(scanned: Dict[str, Tuple]) -> Dict[str, Callable[[str], bool]]:
+    """
+    filters for loading only the database entries which can match one of the installed mods, the names
+    of the "packageid" / "workshopid" entries of installed mods are kept by database_references
+    :param scanned: installed mods, as returned by scan_mod_data
+    :return: section -> filter by key (see RWMS.database.stream_database)
+    """
+    learned = RWMS.cache.load_json(cache_name, {"packageid": {}, "workshopid": {}}, shared=True)
+    names = set()
+    package_ids = set()
+    workshop_ids = set()
+    for mod_id, mod_source, _, about in scanned.values():
+        names.add(cleanup_garbage_name(about["name"]).casefold())
+        package_id = about["packageId"]
+        if package_id:
+            package_ids.add(package_id)
+            if package_id in learned["packageid"]:
+                names.add(learned["packageid"][package_id].casefold())
+        if mod_source == "W":
+            workshop_ids.add(mod_id)
+            if mod_id in learned["workshopid"]:
+                names.add(learned["workshopid"][mod_id].casefold())
+    return {
+        "db": lambda key: key.casefold() in names,
+        "packageid": lambda key: key.lower() in package_ids,
+        "workshopid": lambda key: key in workshop_ids,
+    }
+
+
+def resolve(
+    index: Dict[str, Dict[str, str]], mod_id: str, mod_source: str, about: Dict
+) -> Tuple[Optional[str], Optional[str], str]:
+    """
+    resolves a mod to its database entry
+    :param index: indexes from build_index
+    :param mod_id: mod folder name (the workshop ID for workshop mods)
+    :param mod_source: "W" for workshop, "L" for local mods
+    :param about: About.xml metadata
+    :return: (name in database, tier which resolved it, mod name), the first two are None if unresolved
+    """
+    package_id = about["packageId"]
+    if package_id and package_id in index["packageid"]:
+        name = index["packageid"][package_id]
+        return name, "packageid", name
+    if mod_source == "W" and mod_id in index["workshopid"]:
+        name = index["workshopid"][mod_id]
+        return name, "workshopid", name
+    if package_id and package_id in index["learned_packageid"]:
+        name = index["learned_packageid"][package_id]
+        return name, "learned", name
+    if mod_source == "W" and mod_id in index["learned_workshopid"]:
+        name = index["learned_workshopid"][mod_id]
+        return name, "learned", name
+    name = cleanup_garbage_name(about["name"])
+    db_name = index["name"].get(name, index["name"].get(name.casefold()))
+    if db_name is not None:
+        return db_name, "name", db_name
+    return None, None, name
+
+
+def learn(index: Dict[str, Dict[str, str]], mod_data: Dict[str, Tuple]):
+    """
+    remembers packageIds and workshop IDs of mods resolved by name, a later rename of the mod does not
+    make it unknown then
+    :param index: indexes from build_index
+    :param mod_data: installed mods, as returned by load_mod_data
+    """
+    learned = RWMS.cache.load_json(cache_name, {"packageid": {}, "workshopid": {}}, shared=True)
+    changes = {"packageid": {}, "workshopid": {}}
+    for mod_id, entry in mod_data.items():
+        if entry[6] != "name":
+            continue
+        package_id = entry[5]["packageId"]
+        if package_id and learned["packageid"].get(package_id) != entry[2]:
+            changes["packageid"][package_id] = index["learned_packageid"][package_id] = entry[2]
+        if entry[3] == "W" and learned["workshopid"].get(mod_id) != entry[2]:
+            changes["workshopid"][mod_id] = index["learned_workshopid"][mod_id] = entry[2]
+
+    def merge(current):
+        for key, names in changes.items():
+            current[key].update(names)
+
+    if changes["packageid"] or changes["workshopid"]:
+        RWMS.cache.update_json(cache_name, {"packageid": {}, "workshopid": {}}, merge, shared=True)
@@ -0,0 +1,98 @@
+# RimWorld ModSorter score inference module
+#
+# estimates a score for unknown mods from their About.xml and the known installed mods, so that they can
+# be placed in the load order instead of being appended at the bottom. signals, strongest first:
+# dependencies and loadAfter targets, loadBefore targets, known mods of the same author and known mods
+# with a similar name.
+import collections
+import difflib
+import statistics
+from typing import Callable, Dict, List, Optional, Tuple
+
+import RWMS.about
+
+# distance to the score of the mod an unknown mod is placed after / before
+placement_step = 0.0001
+# minimum similarity of names (see difflib.SequenceMatcher.ratio)
+name_cutoff = 0.75
+
+
+def __by_load_order(about: Dict, score_of: Callable, rimworld_version: str) -> Optional[Tuple[float, str]]:
+    """
+    places a mod after its last dependency / loadAfter target, otherwise before its first loadBefore target
+    """
+    dependencies = RWMS.about.version_entries(about, "modDependencies", rimworld_version)
+    after = [dependency["packageId"] for dependency in dependencies]
+    after += RWMS.about.version_entries(about, "loadAfter", rimworld_version)
+    scored = [score_of(package_id) for package_id in after]
+    scored = [entry for entry in scored if entry is not None]
+    if scored:
+        score, name = max(scored)
+        return score + placement_step, f"loads after {name}"
+
+    before = RWMS.about.version_entries(about, "loadBefore", rimworld_version)
+    scored = [score_of(package_id) for package_id in before]
+    scored = [entry for entry in scored if entry is not None]
+    if scored:
+        score, name = min(scored)
+        return score - placement_step, f"loads before {name}"
+    return None
+
+
+def infer_scores(
+    unknown_mods: List[str], mod_data: Dict[str, Tuple], rimworld_version: str
+) -> Dict[str, Tuple[float, str]]:
+    """
+    infers scores for unknown mods
+    :param unknown_mods: mod IDs of the unknown mods
+    :param mod_data: all installed mods, as returned by load_mod_data
+    :param rimworld_version: RimWorld version for version specific dependencies
+    :return: mod_id -> (score, reason), mods without any usable signal are left out
+    """
+    by_package_id = {entry[5]["packageId"]: mod_id for mod_id, entry in mod_data.items() if entry[5]["packageId"]}
+    known = {mod_id: entry for mod_id, entry in mod_data.items() if entry[1] is not None}
+    inferred = dict()
+
+    def score_of(package_id):
+        mod_id = by_package_id.get(package_id)
+        if mod_id in known:
+            return known[mod_id][1], known[mod_id][2]
+        if mod_id in inferred:
+            return inferred[mod_id][0], mod_data[mod_id][2]
+        return None
+
+    # dependencies may be unknown mods themselves, repeat until no score changes anymore
+    for _ in range(len(unknown_mods)):
+        changed = False
+        for mod_id in unknown_mods:
+            result = __by_load_order(mod_data[mod_id][5], score_of, rimworld_version)
+            if result is not None and result != inferred.get(mod_id):
+                inferred[mod_id] = result
+                changed = True
+        if not changed:
+            break
+
+    by_author = collections.defaultdict(list)
+    by_name = dict()
+    for entry in known.values():
+        if entry[5]["author"]:
+            by_author[entry[5]["author"].casefold()].append(entry)
+        by_name[entry[2].casefold()] = entry
+
+    for mod_id in unknown_mods:
+        if mod_id in inferred:
+            continue
+        author = mod_data[mod_id][5]["author"].casefold()
+        if author in by_author:
+            entries = by_author[author]
+            names = ", ".join(entry[2] for entry in entries[:3]) + (" and others" if len(entries) > 3 else "")
+            inferred[mod_id] = (statistics.median(entry[1] for entry in entries), f"same author as {names}")
+            continue
+        # addons and patches are usually named after the mod they extend
+        name = mod_data[mod_id][2].casefold()
+        prefixes = [known_name for known_name in by_name if name.startswith(known_name) and len(known_name) >= 4]
+        similar = [max(prefixes, key=len)] if prefixes else difflib.get_close_matches(name, by_name, 1, name_cutoff)
+        if similar:
+            entry = by_name[similar[0]]
+            inferred[mod_id] = (entry[1] + placement_step, f"similar name to {entry[2]}")
+    return inferred
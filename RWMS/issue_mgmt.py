@@ -2,13 +2,29 @@
 #
 # adapted for use in RWMS and touched it up for Python 3
 # see https://gist.github.com/JeffPaine/3145490#gistcomment-2558013
+#
+# unknown mods are collected in a persistent queue (deduplicated by cleaned name and mod ID) and
+# submitted in batches, in the background and with respect to the rate limit of the issue API.
 import json
+import sys
+import threading
 import time
+from typing import Dict, List, Optional, Tuple
 
 import requests
 
+import RWMS.cache
 import RWMS.configuration
 
+REPO_OWNER = "shakeyourbunny"
+REPO_NAME = "RWMSDB"
+
+queue_name = "rwms_unknown_queue.json"
+batch_size = 50
+request_timeout = 30
+
+__session = None
+
 
 def get_github_user():
     return RWMS.configuration.load_value("github", "github_username")
@@ -22,50 +38,196 @@ def is_github_configured():
     return get_github_user() and get_github_token()
 
 
-def create_issue(title, body):
-    USERNAME = get_github_user()
-    TOKEN = get_github_token()
+def get_issues_url() -> str:
+    return RWMS.configuration.load_value(
+        "github", "issue_api_url", default=f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/issues"
+    )
 
-    if USERNAME == "" or TOKEN == "":
-        return False
 
-    REPO_OWNER = "shakeyourbunny"
-    REPO_NAME = "RWMSDB"
+def get_session() -> requests.Session:
+    """
+    one pooled session for all requests to the issue API
+    :return: session
+    """
+    global __session
+    if __session is None:
+        __session = requests.Session()
+        __session.auth = (get_github_user(), get_github_token())
+        __session.headers["Accept"] = "application/vnd.github.v3+json"
+    return __session
 
-    url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/issues"
 
-    session = requests.Session()
-    session.auth = (USERNAME, TOKEN)
+def create_issue(title, body):
+    if not is_github_configured():
+        return False
 
     # Create our issue
     data = {"title": title, "body": body}
-    r = session.post(url, json.dumps(data))
+    try:
+        r = get_session().post(get_issues_url(), json=data, timeout=request_timeout)
+    except requests.RequestException as e:
+        print(f"Could not create issue {title:s}: {e}")
+        return False
 
     ok = False
     if r.status_code == 201:
         print(f"Successfully created issue {title}.\n")
         # print(r.content)
         print(f"Your issue URL is: {json.loads(r.content)['url']}\n")
-        time.sleep(2)
         ok = True
     else:
         print(f"Could not create issue {title:s}")
         print(f"Status Code: {r.status_code}")
         print(f"Response:\n{r.content}\n\n")
         print("Please contact the author with the full message from above. Thank you.")
-        time.sleep(2)
         ok = False
-    session.close()
 
     return ok
 
 
+def __new_queue() -> Dict:
+    return {"pending": {}, "submitted": {}, "retry_after": 0, "meta": {}}
+
+
+def load_queue() -> Dict:
+    return RWMS.cache.load_json(queue_name, __new_queue())
+
+
+def enqueue_unknown(unknown_mods: List[Tuple[str, str, str]], meta: Dict) -> int:
+    """
+    adds unknown mods to the submission queue, mods which are already queued or submitted are skipped
+    :param unknown_mods: list of (cleaned name, mod ID, location)
+    :param meta: meta information of the unknown mods report
+    :return: number of newly queued mods
+    """
+    # nothing new, the queue is not written
+    queue = load_queue()
+    known = {**queue["pending"], **queue["submitted"]}
+    if all(f"{name}|{mod_id}" in known for name, mod_id, _ in unknown_mods):
+        return 0
+
+    queued = []
+
+    def add(current):
+        for name, mod_id, location in unknown_mods:
+            key = f"{name}|{mod_id}"
+            if key in current["pending"] or key in current["submitted"]:
+                continue
+            current["pending"][key] = {"name": name, "mod_id": mod_id, "location": location, "time": int(time.time())}
+            queued.append(key)
+        if queued:
+            current["meta"] = meta
+
+    RWMS.cache.update_json(queue_name, __new_queue(), add)
+    return len(queued)
+
+
+def __retry_after(response: requests.Response) -> float:
+    """
+    point in time when the next request is allowed, 0 if not rate limited
+    """
+    if "Retry-After" in response.headers:
+        try:
+            return time.time() + float(response.headers["Retry-After"])
+        except ValueError:
+            return time.time() + 60
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        try:
+            return float(response.headers.get("X-RateLimit-Reset", ""))
+        except ValueError:
+            return time.time() + 60
+    return 0
+
+
+def submit_pending() -> int:
+    """
+    submits all pending unknown mods as issues, one issue per batch, stops on errors or when rate limited.
+    runs in the background, messages go to stderr (stdout may carry the JSON result)
+    :return: number of submitted mods
+    """
+    queue = load_queue()
+    if not queue["pending"] or time.time() < queue["retry_after"]:
+        return 0
+
+    session = get_session()
+    keys = list(queue["pending"])
+    submitted = 0
+    for start in range(0, len(keys), batch_size):
+        # another run may have submitted some of them in the meantime
+        queue = load_queue()
+        batch = [key for key in keys[start : start + batch_size] if key in queue["pending"]]
+        if not batch:
+            continue
+        report = {
+            "version": 2,
+            "meta": queue["meta"],
+            "unknown": {
+                queue["pending"][key]["name"]: ("not_categorized", queue["pending"][key]["location"]) for key in batch
+            },
+        }
+        data = {
+            "title": f"unknown mods found by {get_github_user()} ({len(batch)} mods)",
+            "body": json.dumps(report, indent=True, sort_keys=True),
+        }
+        try:
+            r = session.post(get_issues_url(), json=data, timeout=request_timeout)
+        except requests.RequestException as e:
+            print(f"** could not submit unknown mods: {e}", file=sys.stderr)
+            break
+
+        if r.status_code == 201:
+            now = int(time.time())
+
+            def move(current):
+                for key in batch:
+                    current["pending"].pop(key, None)
+                    current["submitted"][key] = now
+
+            # saved after every batch, an interrupted run must not submit the same mods again
+            RWMS.cache.update_json(queue_name, __new_queue(), move)
+            submitted += len(batch)
+
+        retry_after = __retry_after(r)
+        if retry_after:
+            RWMS.cache.update_json(queue_name, __new_queue(), lambda current: current.update(retry_after=retry_after))
+            break
+        if r.status_code != 201:
+            print(
+                f"** could not submit unknown mods, status code {r.status_code}, will retry on next run.",
+                file=sys.stderr,
+            )
+            break
+
+    return submitted
+
+
+def start_submission() -> Optional[threading.Thread]:
+    """
+    submits pending unknown mods in a background thread, the interpreter waits for it on exit so that the
+    queue is always saved after a submitted batch
+    :return: thread (join it before exiting), None if GitHub is not configured
+    """
+    if not is_github_configured():
+        return None
+
+    def submit():
+        submitted = submit_pending()
+        if submitted:
+            print(f"Submitted {submitted} unknown mods to the RWMSDB issue tracker.", file=sys.stderr)
+
+    thread = threading.Thread(target=submit, name="rwms-unknown-submission")
+    thread.start()
+    return thread
+
+
 # debug
 if __name__ == "__main__":
 
     if is_github_configured():
         print(f"Github User: {get_github_user()}")
         print(f"Github Token: {get_github_token()}")
+        print(f"Issue API: {get_issues_url()}")
+        print(f"Pending unknown mods: {len(load_queue()['pending'])}")
     else:
         print("Github configuration incomplete (user and/or token).")
 
@@ -0,0 +1,110 @@
+# RimWorld ModSorter memo module
+#
+# remembers sorted load orders by a fingerprint of all sort inputs, so that an unchanged
+# installation does not need to be scanned and sorted again.
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import RWMS.cache
+
+memo_file = "rwms_memo.json"
+memo_entries = 32
+
+
+def mod_generation(mod_dirs: Iterable[Optional[Path]], workshop_stamps: Dict[str, str]) -> str:
+    """
+    cheap generation stamp of the installed mods, changes when a mod is added, removed or its About.xml changes
+    :param mod_dirs: mod base directories
+    :param workshop_stamps: change stamps of the workshop mods (see RWMS.workshop.item_stamps)
+    :return: hex digest
+    """
+    digest = hashlib.sha1()
+    for item_id, stamp in sorted(workshop_stamps.items()):
+        digest.update(f"{item_id}:{stamp};".encode("utf-8"))
+    for mod_dir in mod_dirs:
+        if mod_dir is None:
+            continue
+        digest.update(str(mod_dir).encode("utf-8"))
+        try:
+            entries = sorted(os.scandir(str(mod_dir)), key=lambda e: e.name)
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                stat = os.stat(os.path.join(entry.path, "About", "About.xml"))
+                digest.update(f"{entry.name}:{stat.st_mtime_ns}:{stat.st_size};".encode("utf-8"))
+            except OSError:
+                digest.update(f"{entry.name}:-;".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def tweak_set(tweaks_dir: Path, disabled: bool) -> str:
+    """
+    fingerprint of the user tweak files
+    :param tweaks_dir: tweak directory
+    :param disabled: tweaks are disabled
+    :return: hex digest
+    """
+    if disabled:
+        return "disabled"
+    digest = hashlib.sha1()
+    if tweaks_dir.is_dir():
+        for tweak_file in sorted(tweaks_dir.glob("*.ini")):
+            digest.update(tweak_file.name.encode("utf-8"))
+            digest.update(tweak_file.read_bytes())
+    return digest.hexdigest()
+
+
+def fingerprint(active_mods: List[str], database: str, categories: dict, tweaks: str, generation: str, *options) -> str:
+    """
+    fingerprint of all inputs of a sort run
+    :param active_mods: active mod list as read from ModsConfig.xml
+    :param database: change stamp of the database download (see RWMS.database.download_stamp)
+    :param categories: categories, they set the scores
+    :param tweaks: tweak set fingerprint
+    :param generation: mod generation stamp
+    :param options: further options which change the result of a run
+    :return: hex digest
+    """
+    digest = hashlib.sha1()
+    for part in (
+        "\n".join(active_mods),
+        database,
+        json.dumps(categories, sort_keys=True),
+        tweaks,
+        generation,
+        *(str(option) for option in options),
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def lookup(key: str) -> Optional[List[str]]:
+    """
+    looks up the load order stored for a fingerprint
+    :param key: fingerprint
+    :return: load order or None
+    """
+    entry = RWMS.cache.load_json(memo_file, {}).get(key)
+    if entry is None:
+        return None
+    return entry["order"]
+
+
+def store(key: str, order: List[str]):
+    """
+    stores the sorted load order for a fingerprint, keeps only the most recent entries
+    :param key: fingerprint
+    :param order: load order
+    """
+    memo = RWMS.cache.load_json(memo_file, {})
+    memo.pop(key, None)
+    memo[key] = {"order": order, "time": int(time.time())}
+    while len(memo) > memo_entries:
+        del memo[next(iter(memo))]
+    RWMS.cache.save_json(memo_file, memo)
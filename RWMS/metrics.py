@@ -0,0 +1,157 @@
+# RimWorld ModSorter metrics module
+#
+# every run appends a compact record (stage timings, mod counts, database version, cache hit rates,
+# downloaded bytes) to a JSON lines file in the cache directory. --stats summarizes these records and
+# flags stages which got slower than their rolling median.
+import json
+import os
+import statistics
+import time
+from typing import Dict, List
+
+import RWMS.cache
+import RWMS.database
+import RWMS.defs
+import RWMS.footprint
+import RWMS.workshop
+
+metrics_name = "rwms_metrics.jsonl"
+# the file is trimmed to the most recent records once it gets bigger than this
+max_records = 1000
+max_bytes = 512 * 1024
+# stages faster than this are not flagged, their timings are mostly noise
+noise_floor = 0.01
+
+
+def __line(record: Dict) -> str:
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """
+    cache hits and misses of this run, every module with a cache counts them in its cache_stats
+    :return: cache -> {"hits", "misses"}
+    """
+    return {
+        "about": dict(RWMS.workshop.cache_stats),
+        "defs": dict(RWMS.defs.cache_stats),
+        "footprint": dict(RWMS.footprint.cache_stats),
+        "downloads": {key: RWMS.database.cache_stats[key] for key in ("hits", "misses")},
+    }
+
+
+def append_run(result: Dict):
+    """
+    appends the record of a run to the metrics file
+    :param result: result of the run (see sort_mods in rwms_sort.py)
+    """
+    record = {
+        "time": int(time.time()),
+        "rwms_version": result.get("rwms_version"),
+        "exit_code": result.get("exit_code"),
+        "memo_hit": result.get("memo_hit"),
+        "db_version": result.get("database", {}).get("version"),
+        "db_entries": result.get("database", {}).get("entries"),
+        "timings": result.get("timings", {}),
+        "counts": result.get("counts", {}),
+        "cache": result.get("cache", {}),
+        "bytes_downloaded": RWMS.database.cache_stats["bytes"],
+    }
+    target = RWMS.cache.cache_file(metrics_name)
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with RWMS.cache.file_lock(target):
+            with open(str(target), "a", encoding="utf-8", newline="\n") as f:
+                f.write(__line(record))
+            if os.path.getsize(str(target)) > max_bytes:
+                records = load_runs()[-max_records:]
+                with RWMS.cache.replacing(metrics_name) as f:
+                    f.write("".join(__line(r) for r in records).encode("utf-8"))
+    except OSError as e:
+        print(f"** warning: could not write metrics file {target}: {e}")
+
+
+def load_runs() -> List[Dict]:
+    """
+    loads all run records, broken lines are skipped
+    :return: records, oldest first
+    """
+    records = []
+    try:
+        with open(str(RWMS.cache.cache_file(metrics_name)), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return records
+
+
+def __hit_rate(records: List[Dict], cache: str) -> float:
+    hits = sum(r.get("cache", {}).get(cache, {}).get("hits", 0) for r in records)
+    misses = sum(r.get("cache", {}).get(cache, {}).get("misses", 0) for r in records)
+    return hits / (hits + misses) if hits + misses else None
+
+
+def summarize(records: List[Dict], threshold: float, window: int) -> Dict:
+    """
+    summarizes run records, the last run of every stage is compared to the median of the runs before it
+    :param records: run records, oldest first
+    :param threshold: flag stages which are more than this many percent slower than their median
+    :param window: number of runs before the last one the median is taken of
+    :return: summary
+    """
+    stages = dict()
+    for name in dict.fromkeys(stage for r in records for stage in r.get("timings", {})):
+        timings = [r["timings"][name] for r in records if name in r.get("timings", {})]
+        last = timings[-1]
+        median = statistics.median(timings[-window - 1 : -1]) if len(timings) > 1 else None
+        change = (last - median) / median * 100 if median else None
+        stages[name] = {
+            "runs": len(timings),
+            "median": median,
+            "last": last,
+            "change": change,
+            "slower": change is not None and change > threshold and last - median > noise_floor,
+        }
+
+    full_runs = [r for r in records if r.get("counts")]
+    return {
+        "runs": len(records),
+        "first": records[0]["time"] if records else None,
+        "last": records[-1]["time"] if records else None,
+        "memo_hits": sum(1 for r in records if r.get("memo_hit")),
+        "stages": stages,
+        "counts": {"first": full_runs[0]["counts"], "last": full_runs[-1]["counts"]} if full_runs else {},
+        "db_versions": list(dict.fromkeys(r["db_version"] for r in records if r.get("db_version") is not None)),
+        "cache_hit_rates": {cache: __hit_rate(records, cache) for cache in ("about", "defs", "footprint", "downloads")},
+        "bytes_downloaded": sum(r.get("bytes_downloaded", 0) for r in records),
+    }
+
+
+def print_stats(summary: Dict, threshold: float):
+    if not summary["runs"]:
+        print("no runs recorded yet.")
+        return
+    first = time.strftime("%Y-%m-%d %H:%M", time.localtime(summary["first"]))
+    last = time.strftime("%Y-%m-%d %H:%M", time.localtime(summary["last"]))
+    print(f"{summary['runs']} runs from {first} to {last}, {summary['memo_hits']} skipped as unchanged.\n")
+
+    print(f"{'Stage':<16} {'Runs':>5} {'Median':>9} {'Last':>9} {'Change':>8}")
+    for name, stage in summary["stages"].items():
+        median = f"{stage['median']:.3f}s" if stage["median"] is not None else "-"
+        change = f"{stage['change']:+.0f}%" if stage["change"] is not None else "-"
+        flag = f"  ** more than {threshold:g}% slower" if stage["slower"] else ""
+        print(f"{name:<16} {stage['runs']:>5} {median:>9} {stage['last']:>8.3f}s {change:>8}{flag}")
+
+    if summary["counts"]:
+        print(f"\n{'Mods':<18} {'First run':>9} {'Last run':>9}")
+        for key, value in summary["counts"]["last"].items():
+            print(f"{key:<18} {summary['counts']['first'].get(key, '-'):>9} {value:>9}")
+
+    print(f"\nDatabase versions: {', '.join(str(version) for version in summary['db_versions']) or '-'}")
+    rates = [f"{cache} {rate:.0%}" for cache, rate in summary["cache_hit_rates"].items() if rate is not None]
+    print(f"Cache hit rates: {', '.join(rates) or '-'}")
+    print(f"Downloaded: {RWMS.footprint.human_size(summary['bytes_downloaded'])}")
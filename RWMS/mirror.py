@@ -0,0 +1,232 @@
+# RimWorld ModSorter database mirror
+#
+# serves the database, the categories and a precompiled score index (for other tools, RWMS itself reads
+# the database) over HTTP, so that the hosts of a fleet do not download the database from upstream each
+# on their own. upstream is fetched on a schedule,
+# if it cannot be reached the last fetched version is served on. supports ETag, gzip and range requests.
+import gzip
+import hashlib
+import json
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import RWMS.database
+
+database_name = "rwmsdb.json"
+index_name = "rwms_score_index.json"
+default_address = "127.0.0.1:8394"
+
+
+def build_score_index(database: Dict, categories: Dict) -> Dict:
+    """
+    normalized score index: scores by case folded mod name, packageId and workshop ID lookups by mod name
+    :param database: full database
+    :param categories: categories
+    :return: score index
+    """
+    scores = dict()
+    for name, category in database["db"].items():
+        if category in categories:
+            scores[name.casefold()] = float(categories[category][0])
+        else:
+            print(f"** mod '{name}' has an unknown category '{category}', not in the score index.")
+    return {
+        "version": database.get("version"),
+        "timestamp": database.get("timestamp"),
+        "scores": scores,
+        "packageid": {key.lower(): name for key, name in database.get("packageid", {}).items()},
+        "workshopid": database.get("workshopid", {}),
+    }
+
+
+def __file_entry(data: bytes, previous: Optional[Dict]) -> Dict:
+    etag = f'"{hashlib.sha1(data).hexdigest()}"'
+    if previous is not None and previous["etag"] == etag:
+        # unchanged, keeps its Last-Modified
+        return previous
+    return {
+        "data": data,
+        "gzip": gzip.compress(data, 9),
+        "etag": etag,
+        "gzip_etag": f'"{etag[1:-1]}-gz"',
+        "modified": formatdate(time.time(), usegmt=True),
+    }
+
+
+def refresh(server: ThreadingHTTPServer, categories_url: str, database_url: str) -> bool:
+    """
+    fetches the database and the categories and precompiles the served files
+    :param server: mirror server, its files are replaced
+    :param categories_url: upstream categories URL
+    :param database_url: upstream database URL
+    :return: True if refreshed, False if the last version is still served
+    """
+    try:
+        with RWMS.database.open_download(categories_url) as f:
+            categories_raw = f.read()
+        with RWMS.database.open_download(database_url) as f:
+            database_raw = f.read()
+        categories = json.loads(categories_raw.decode("utf-8-sig"))
+        database = json.loads(database_raw.decode("utf-8-sig"))
+        index = json.dumps(build_score_index(database, categories), separators=(",", ":"), sort_keys=True)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"** could not refresh the database mirror: {e}")
+        if server.files:
+            print("still serving the last fetched version.")
+        return False
+
+    previous = server.files
+    files = {
+        RWMS.database.categories_name: categories_raw,
+        database_name: database_raw,
+        index_name: index.encode("utf-8"),
+    }
+    # replaced as a whole, requests being served keep the version they started with
+    server.files = {f"/{name}": __file_entry(data, previous.get(f"/{name}")) for name, data in files.items()}
+    if server.files[f"/{database_name}"] is not previous.get(f"/{database_name}"):
+        print(f"Database mirror serves database v{database.get('version')} ({len(database['db'])} mods).")
+    return True
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    parses a single byte range of a Range header
+    :param header: Range header, e.g. "bytes=0-499", "bytes=500-", "bytes=-500"
+    :param size: size of the file
+    :return: (first, last) byte position, None if the header is not a single byte range (whole file is sent)
+    :raises ValueError: range cannot be satisfied
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        return None
+    first, _, last = ranges.strip().partition("-")
+    if not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if first and last and int(first) > int(last):
+        return None
+    if first == "":
+        # suffix range, the last n bytes
+        if int(last) == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - int(last)), size - 1
+    if int(first) >= size:
+        raise ValueError("range starts after the end of the file")
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+
+def accepts_gzip(header: str) -> bool:
+    """
+    checks if an Accept-Encoding header allows gzip, honoring q-values ("gzip;q=0" refuses it)
+    :param header: Accept-Encoding header
+    :return: True if the response may be gzip encoded
+    """
+    qualities = dict()
+    for coding in header.split(","):
+        name, *params = [part.strip() for part in coding.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.lower()] = quality
+    return qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0))) > 0
+
+
+class MirrorHandler(BaseHTTPRequestHandler):
+    server_version = "RWMS-mirror"
+
+    def do_GET(self):
+        self.__send(True)
+
+    def do_HEAD(self):
+        self.__send(False)
+
+    def __send(self, with_body: bool):
+        entry = self.server.files.get(urlsplit(self.path).path)
+        if entry is None:
+            self.send_error(404)
+            return
+
+        use_gzip = accepts_gzip(self.headers.get("Accept-Encoding", ""))
+        etag = entry["gzip_etag"] if use_gzip else entry["etag"]
+        if_none_match = [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]
+        if "*" in if_none_match or entry["etag"] in if_none_match or entry["gzip_etag"] in if_none_match:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        data = entry["data"]
+        byte_range = None
+        if "Range" in self.headers and self.headers.get("If-Range", entry["etag"]) == entry["etag"]:
+            try:
+                byte_range = parse_range(self.headers["Range"], len(data))
+            except ValueError:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+        if byte_range is not None:
+            # ranges are always served from the uncompressed file
+            first, last = byte_range
+            body = data[first : last + 1]
+            etag = entry["etag"]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {first}-{last}/{len(data)}")
+        elif use_gzip:
+            body = entry["gzip"]
+            self.send_response(200)
+            self.send_header("Content-Encoding", "gzip")
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", entry["modified"])
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Vary", "Accept-Encoding")
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+
+def serve(address: str, interval: float):
+    """
+    runs the database mirror until interrupted
+    :param address: HOST:PORT to listen on
+    :param interval: minutes between two fetches from upstream
+    """
+    host, _, port = address.rpartition(":")
+    categories_url, database_url = RWMS.database.database_urls()
+    server = ThreadingHTTPServer((host or "0.0.0.0", int(port)), MirrorHandler)
+    server.daemon_threads = True
+    server.files = dict()
+    if not refresh(server, categories_url, database_url):
+        print("*** nothing to serve yet, retrying on the next scheduled fetch.")
+
+    stop = threading.Event()
+
+    def update():
+        while not stop.wait(interval * 60):
+            refresh(server, categories_url, database_url)
+
+    threading.Thread(target=update, name="rwms-mirror-update", daemon=True).start()
+    print(f"Database mirror listening on http://{address}/, fetching {database_url} every {interval:g} minutes.")
+    print(f"Clients: set database_url = http://{address}/{database_name}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Database mirror stopped.")
+    finally:
+        stop.set()
+        server.server_close()
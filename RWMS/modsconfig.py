@@ -0,0 +1,103 @@
+# RimWorld ModSorter ModsConfig.xml handling
+#
+# ModsConfig.xml is read and parsed exactly once, writing only replaces the <activeMods> block
+# of the original file content, everything else (comments, formatting, BOM) stays as it is.
+import os
+import re
+import shutil
+import tempfile
+import xml.etree.ElementTree as ElementTree
+from pathlib import Path
+from typing import List, Tuple
+from xml.sax.saxutils import escape
+
+active_mods_regex = re.compile(
+    rb"(?P<indent>[ \t]*)<activeMods\b[^>]*?(?:/>|>(?P<body>.*?)</activeMods\s*>)", re.DOTALL
+)
+item_indent_regex = re.compile(rb"\n(?P<indent>[ \t]*)<li\b")
+comment_regex = re.compile(rb"<!--.*?-->", re.DOTALL)
+
+
+def read_modsconfig(mods_config_file: Path) -> Tuple[bytes, ElementTree.Element]:
+    """
+    reads and parses ModsConfig.xml
+    :param mods_config_file: path of ModsConfig.xml
+    :return: raw file content and parsed root element
+    """
+    with open(str(mods_config_file), "rb") as f:
+        raw = f.read()
+    return raw, ElementTree.fromstring(raw)
+
+
+def active_mods(root: ElementTree.Element) -> List[str]:
+    """
+    active mod list of a parsed ModsConfig.xml
+    :param root: root element
+    :return: mod ids in load order
+    """
+    return [li.text for li in root.find("activeMods").findall("li")]
+
+
+def rimworld_version(root: ElementTree.Element) -> str:
+    """
+    RimWorld version ModsConfig.xml was written with
+    :param root: root element
+    :return: version or build number, "unknown" if not available
+    """
+    for tag in ("version", "buildNumber"):
+        element = root.find(tag)
+        if element is not None and element.text:
+            return element.text
+    return "unknown"
+
+
+def replace_active_mods(raw: bytes, mods: List[str]) -> bytes:
+    """
+    replaces the <activeMods> block in the raw file content, keeps the rest byte for byte
+    :param raw: original file content
+    :param mods: new active mod list
+    :return: new file content
+    """
+    # comments are blanked out, an <activeMods> inside of a comment is not the real one
+    match = active_mods_regex.search(comment_regex.sub(lambda m: b" " * len(m.group()), raw))
+    if match is None:
+        raise ValueError("no <activeMods> block found")
+
+    indent = match.group("indent")
+    item_indent = indent + b"  "
+    body = raw[match.start("body") : match.end("body")] if match.group("body") is not None else None
+    if body:
+        item_match = item_indent_regex.search(body)
+        if item_match:
+            item_indent = item_match.group("indent")
+
+    block = [indent, b"<activeMods>"]
+    for mod in mods:
+        block += [b"\n", item_indent, b"<li>", escape(mod).encode("utf-8"), b"</li>"]
+    if mods:
+        block += [b"\n", indent]
+    block.append(b"</activeMods>")
+
+    return raw[: match.start()] + b"".join(block) + raw[match.end() :]
+
+
+def write_modsconfig(mods_config_file: Path, data: bytes):
+    """
+    atomically replaces ModsConfig.xml, the game never sees a half written file
+    :param mods_config_file: path of ModsConfig.xml
+    :param data: new file content
+    """
+    fd, tmp_name = tempfile.mkstemp(prefix=".ModsConfig.", suffix=".xml", dir=str(mods_config_file.parent))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # temporary files are created with mode 0600
+        if mods_config_file.exists():
+            shutil.copymode(str(mods_config_file), tmp_name)
+        os.replace(tmp_name, str(mods_config_file))
+    except:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
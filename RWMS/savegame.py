@@ -0,0 +1,65 @@
+# RimWorld ModSorter savegame module
+#
+# reads the mod list a savegame (.rws) was made with. savegames can be hundreds of MB, so only
+# the <meta> header at the start of the file is parsed incrementally and reading stops after it.
+import xml.etree.ElementTree as ElementTree
+from pathlib import Path
+from typing import Dict, List
+
+import RWMS.configuration
+
+
+def find_savegame(name: str) -> Path:
+    """
+    locates a savegame, either by path or by name in the RimWorld savegame directory
+    :param name: path or save name (with or without .rws)
+    :return: path to savegame (may not exist)
+    """
+    save_file = Path(name)
+    if save_file.is_file():
+        return save_file
+    save_dir = RWMS.configuration.detect_rimworld_savedir()
+    if save_file.suffix != ".rws":
+        save_file = save_file.with_name(save_file.name + ".rws")
+    return save_dir / save_file.name
+
+
+def read_savegame_meta(save_file: Path) -> Dict[str, List[str]]:
+    """
+    reads the meta header of a savegame without loading the full document
+    :param save_file: path to savegame
+    :return: dict with "gameVersion", "modIds" and "modNames"
+    """
+    meta = {"gameVersion": "unknown", "modIds": [], "modNames": []}
+    depth = 0
+    in_meta = False
+    with open(str(save_file), "rb") as f:
+        for event, element in ElementTree.iterparse(f, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if depth == 2:
+                    if element.tag != "meta":
+                        # meta is always the first child of <savegame>, no meta header here.
+                        break
+                    in_meta = True
+                continue
+
+            depth -= 1
+            if not in_meta:
+                continue
+            if depth == 2:
+                if element.tag == "gameVersion":
+                    meta["gameVersion"] = (element.text or "").strip() or "unknown"
+                elif element.tag in ("modIds", "modNames"):
+                    meta[element.tag] = [(li.text or "").strip() for li in element.findall("li")]
+            elif depth == 1:
+                # end of <meta>, everything we need is read.
+                break
+    return meta
+
+
+# debug
+if __name__ == "__main__":
+    import sys
+
+    print(read_savegame_meta(find_savegame(sys.argv[1])))
@@ -5,15 +5,12 @@
 import sys
 from urllib.request import urlopen
 
-import RWMS.configuration
 import RWMS.error
 
 version_url = "https://api.bitbucket.org/2.0/repositories/shakeyourbunny/rwms/src/master/VERSION"
 
-wait_on_error = RWMS.configuration.load_value("rwms", "waitforkeypress_on_error", True)
 
-
-def __load_version_from_repo() -> str:
+def __load_version_from_repo(wait_on_error: bool = True) -> str:
     try:
         data = urlopen(version_url)
 
@@ -25,11 +22,11 @@ def __load_version_from_repo() -> str:
     return version
 
 
-def is_update_available(current_version) -> bool:
+def is_update_available(current_version, wait_on_error: bool = True) -> bool:
     if current_version == "":
         return False
 
-    if __load_version_from_repo() == current_version:
+    if __load_version_from_repo(wait_on_error) == current_version:
         return False
     else:
         return True
@@ -0,0 +1,82 @@
+# RimWorld ModSorter validation module
+#
+# checks the active mod set for missing dependencies and incompatibilities (as declared in About.xml).
+from typing import Dict, List, Tuple
+
+import RWMS.about
+
+# packageIds provided by the game itself (Core and the DLCs)
+official_prefix = "ludeon.rimworld"
+
+
+def __is_official(package_id: str) -> bool:
+    return package_id.startswith(official_prefix)
+
+
+def installed_mod_ids(active_mods: List[str], mod_data: Dict[str, Tuple]) -> List[str]:
+    """
+    maps an active mod list to the IDs of the installed mods, RimWorld 1.1 and later lists packageIds
+    :param active_mods: active mod list (mod folder names or packageIds)
+    :param mod_data: all installed mods, as returned by load_mod_data
+    :return: mod IDs, entries which are not installed are kept as they are
+    """
+    by_package_id = {entry[5]["packageId"]: mod_id for mod_id, entry in mod_data.items() if entry[5]["packageId"]}
+    # the game itself is always installed as Core
+    by_package_id.setdefault(official_prefix, "Core")
+    return [mod if mod in mod_data else by_package_id.get(mod.lower(), mod) for mod in active_mods]
+
+
+def check_active_mods(active_mods: List[str], mod_data: Dict[str, Tuple], rimworld_version: str) -> Dict[str, List]:
+    """
+    validates the active mod list in one pass over the active mods
+    :param active_mods: active mod list (mod folder names or packageIds)
+    :param mod_data: all installed mods, as returned by load_mod_data
+    :param rimworld_version: RimWorld version for version specific dependencies
+    :return: dict with lists of problems:
+             "not_installed": active entries which are not installed
+             "missing": (mod_id, dependency packageId, dependency name) for dependencies which are not installed
+             "disabled": (mod_id, dependency packageId, dependency name) for installed, but inactive dependencies
+             "incompatible": (mod_id, mod_id) pairs of active mods which are incompatible with each other
+    """
+    # indexes over all installed mods
+    by_package_id = {entry[5]["packageId"]: mod_id for mod_id, entry in mod_data.items() if entry[5]["packageId"]}
+
+    active_ids = []
+    active_package_ids = set()
+    problems = {"not_installed": [], "missing": [], "disabled": [], "incompatible": []}
+    for mod in active_mods:
+        mod_id = mod if mod in mod_data else by_package_id.get(mod.lower())
+        if mod_id is None:
+            if __is_official(mod.lower()):
+                active_package_ids.add(mod.lower())
+            else:
+                problems["not_installed"].append(mod)
+            continue
+        active_ids.append(mod_id)
+        package_id = mod_data[mod_id][5]["packageId"]
+        if package_id:
+            active_package_ids.add(package_id)
+
+    incompatible_pairs = set()
+    for mod_id in active_ids:
+        about = mod_data[mod_id][5]
+        for dependency in RWMS.about.version_entries(about, "modDependencies", rimworld_version):
+            package_id = dependency["packageId"]
+            if package_id in active_package_ids or __is_official(package_id):
+                continue
+            if package_id in by_package_id:
+                problems["disabled"].append((mod_id, package_id, dependency["displayName"]))
+            else:
+                problems["missing"].append((mod_id, package_id, dependency["displayName"]))
+
+        for package_id in RWMS.about.version_entries(about, "incompatibleWith", rimworld_version):
+            if package_id in active_package_ids:
+                pair = tuple(sorted((mod_id, by_package_id.get(package_id, package_id))))
+                if pair not in incompatible_pairs:
+                    incompatible_pairs.add(pair)
+                    problems["incompatible"].append(pair)
+    return problems
+
+
+def has_problems(problems: Dict[str, List]) -> bool:
+    return any(problems.values())
@@ -0,0 +1,139 @@
+# RimWorld ModSorter Steam Workshop module
+#
+# Steam records the update time and size of every installed workshop item in
+# steamapps/workshop/appworkshop_294100.acf, reading that single file tells which mod folders
+# changed since the last run. without (usable) manifest the mod folders are checked one by one.
+import os
+import re
+from pathlib import Path
+from typing import Dict, Optional
+
+import RWMS.cache
+
+cache_name = "rwms_about_cache.json"
+cache_stats = {"hits": 0, "misses": 0}
+vdf_token_regex = re.compile(r'"((?:[^"\\]|\\.)*)"|([{}])|//[^\n]*|\s+')
+
+
+def parse_vdf(text: str) -> Dict:
+    """
+    parses Valve's KeyValues (VDF) text format
+    :param text: file content
+    :return: nested dicts of strings
+    """
+    root = {}
+    stack = [root]
+    key = None
+    for match in vdf_token_regex.finditer(text):
+        string, brace = match.groups()
+        if string is not None:
+            string = string.replace('\\"', '"').replace("\\\\", "\\")
+            if key is None:
+                key = string
+            else:
+                stack[-1][key] = string
+                key = None
+        elif brace == "{":
+            if key is None:
+                raise ValueError("VDF block without key")
+            block = {}
+            stack[-1][key] = block
+            stack.append(block)
+            key = None
+        elif brace == "}":
+            if len(stack) == 1:
+                raise ValueError("unbalanced VDF block")
+            stack.pop()
+    return root
+
+
+def manifest_file(workshop_dir: Path) -> Path:
+    """
+    location of the workshop manifest for a workshop content directory
+    :param workshop_dir: steamapps/workshop/content/294100
+    :return: steamapps/workshop/appworkshop_294100.acf
+    """
+    return workshop_dir.parent.parent / f"appworkshop_{workshop_dir.name}.acf"
+
+
+def load_manifest(workshop_dir: Path) -> Optional[Dict[str, Dict[str, int]]]:
+    """
+    installed workshop items from the manifest
+    :param workshop_dir: workshop content directory
+    :return: item id -> {"timeupdated", "size"}, None if the manifest is missing or unreadable
+    """
+    try:
+        with open(str(manifest_file(workshop_dir)), "r", encoding="utf-8", errors="replace") as f:
+            vdf = parse_vdf(f.read())
+        installed = vdf["AppWorkshop"]["WorkshopItemsInstalled"]
+        return {
+            item_id: {"timeupdated": int(item.get("timeupdated", 0)), "size": int(item.get("size", 0))}
+            for item_id, item in installed.items()
+        }
+    except (OSError, ValueError, KeyError, AttributeError):
+        return None
+
+
+def item_stamps(workshop_dir: Path) -> Dict[str, str]:
+    """
+    change stamps of all workshop mod folders, taken from the manifest if it matches the installed
+    folders, otherwise from the About.xml of every folder
+    :param workshop_dir: workshop content directory
+    :return: item id -> stamp
+    """
+    try:
+        folders = set(os.listdir(str(workshop_dir)))
+    except OSError:
+        return {}
+
+    manifest = load_manifest(workshop_dir)
+    if manifest is not None and set(manifest) == folders:
+        return {item_id: f"m:{item['timeupdated']}:{item['size']}" for item_id, item in manifest.items()}
+
+    if manifest is not None:
+        print("Steam workshop manifest does not match the installed mods, checking all mod folders.")
+    stamps = {}
+    for item_id in folders:
+        try:
+            stat = os.stat(os.path.join(str(workshop_dir), item_id, "About", "About.xml"))
+            stamps[item_id] = f"s:{stat.st_mtime_ns}:{stat.st_size}"
+        except OSError:
+            stamps[item_id] = "s:-"
+    return stamps
+
+
+def cached_abouts(stamps: Dict[str, str]) -> Dict[str, Dict]:
+    """
+    About.xml metadata of all workshop items which did not change since the last run
+    :param stamps: current change stamps
+    :return: item id -> metadata dict
+    """
+    cache = RWMS.cache.load_json(cache_name, {}, shared=True)
+    abouts = {
+        item_id: cache[item_id]["about"]
+        for item_id, stamp in stamps.items()
+        if item_id in cache and cache[item_id]["stamp"] == stamp
+    }
+    cache_stats["hits"] += len(abouts)
+    cache_stats["misses"] += len(stamps) - len(abouts)
+    return abouts
+
+
+def store_abouts(stamps: Dict[str, str], abouts: Dict[str, Dict]):
+    """
+    remembers About.xml metadata of the workshop items for the next run
+    :param stamps: current change stamps
+    :param abouts: item id -> metadata dict
+    """
+    RWMS.cache.save_json(
+        cache_name,
+        {item_id: {"stamp": stamps[item_id], "about": about} for item_id, about in abouts.items() if item_id in stamps},
+        shared=True,
+    )
+
+
+# debug
+if __name__ == "__main__":
+    import RWMS.configuration
+
+    print(load_manifest(RWMS.configuration.detect_steamworkshop_dir()))
@@ -1,28 +1,42 @@
 #!/usr/bin/env python3
 # RimWorld Module Sorter
 import collections
+import contextlib
 import json
+import multiprocessing
 import os
-import re
 import shutil
 import sys
 import textwrap
 import time
+import traceback
 import webbrowser
 import xml.etree.ElementTree as ElementTree
 from argparse import ArgumentParser, Namespace
 from operator import itemgetter
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple
 from urllib.request import urlopen
 
 from bs4 import BeautifulSoup
 
+import RWMS.about
 import RWMS.configuration
+import RWMS.defs
 import RWMS.database
 import RWMS.error
+import RWMS.footprint
+import RWMS.identity
+import RWMS.inference
 import RWMS.issue_mgmt
+import RWMS.memo
+import RWMS.metrics
+import RWMS.mirror
+import RWMS.modsconfig
+import RWMS.savegame
 import RWMS.update
+import RWMS.validation
+import RWMS.workshop
 
 VERSION = "0.95.1.4"
 
@@ -39,20 +53,49 @@ def wait_for_exit(exit_code, wfo=True):
     sys.exit(exit_code)
 
 
+def ask_yes_no(question: str, answer: Optional[bool] = None) -> bool:
+    """
+    asks a yes / no question
+    :param question: question
+    :param answer: given answer (non interactive mode), None to ask
+    :return: True for yes
+    """
+    if answer is not None:
+        print(f"{question}{'y' if answer else 'n'} (non interactive)")
+        return answer
+    while True:
+        data = input(question)
+        if data.lower() in ("y", "n"):
+            return data.lower() == "y"
+
+
+def stage_done(timings: Dict[str, float], stage: str, start: float) -> float:
+    """
+    records the duration of a stage
+    :param timings: stage -> seconds
+    :param stage: stage name
+    :param start: start time of the stage (time.perf_counter)
+    :return: start time of the next stage
+    """
+    now = time.perf_counter()
+    timings[stage] = round(now - start, 4)
+    return now
+
+
 def check_directory(directory: str):
     if not os.path.exists(directory):
         print(f"** Directory '{directory}' does not exist or is not accessible.")
+        RWMS.error.last_error = f"directory '{directory}' does not exist or is not accessible"
         return False
     return True
 
 
-def print_dry_run(config_file, final_doc, mod_data):
+def print_dry_run(initial: List[str], final: List[str], mod_data):
     print("This is a dry run, nothing will be changed\n")
-    initial = [x.text for x in ElementTree.parse(config_file).getroot().find("activeMods").findall("li")]
-    final = [x.text for x in final_doc.getroot().find("activeMods").findall("li")]
     for i, mod in enumerate(initial):
         initial_pos = i + 1
-        name = mod_data[mod][2]
+        # not installed mods (e.g. of a savegame) are shown by their ID
+        name = mod_data[mod][2] if mod in mod_data else mod
         try:
             final_pos = final.index(mod) + 1
 
@@ -65,7 +108,7 @@ def print_dry_run(config_file, final_doc, mod_data):
 
     print("\n\nResultant order is: ")
     for i, mod in enumerate(final):
-        name = mod_data[mod][2]
+        name = mod_data[mod][2] if mod in mod_data else mod
         print(f"{i + 1} - {name} - {mod}")
 
 
@@ -99,6 +142,95 @@ def get_args() -> Namespace:
     )
 
     parser.add_argument("--reset-to-core", action="store_true", help="reset mod list to Core only")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="only validate dependencies and incompatibilities of the active mods, exit code 2 on problems (for CI)",
+    )
+    parser.add_argument(
+        "--from-save",
+        action="store",
+        metavar="SAVEGAME",
+        help="sort the mod list of a savegame (file or save name) and write it to ModsConfig.xml",
+    )
+    parser.add_argument(
+        "--conflicts",
+        action="store_true",
+        help="report active mods which define or patch the same Defs, and which one wins in the new load order",
+    )
+    parser.add_argument(
+        "--footprint",
+        action="store_true",
+        help="report the estimated load cost (disk size, textures etc) of active mods",
+    )
+    parser.add_argument(
+        "--footprint-sort",
+        action="store",
+        default="bytes",
+        choices=RWMS.footprint.footprint_keys,
+        help="sort key of the footprint report (default: bytes)",
+    )
+    parser.add_argument(
+        "--footprint-json", action="store", metavar="FILE", help="write the footprint of active mods as JSON to FILE"
+    )
+    parser.add_argument(
+        "--resolution-report",
+        action="store_true",
+        help="list how each installed mod was found in the database (packageId, workshop ID, name)",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="always scan and sort, even if the inputs did not change since last run"
+    )
+    parser.add_argument(
+        "--serve-db",
+        action="store_true",
+        help="run a database mirror for other RWMS installations (see database_url in the configuration file)",
+    )
+    parser.add_argument(
+        "--serve-address",
+        action="store",
+        default=RWMS.mirror.default_address,
+        metavar="HOST:PORT",
+        help=f"address the database mirror listens on (default: {RWMS.mirror.default_address})",
+    )
+    parser.add_argument(
+        "--serve-interval",
+        action="store",
+        type=float,
+        default=60.0,
+        metavar="MINUTES",
+        help="minutes between two fetches of the database mirror from upstream (default: 60)",
+    )
+    parser.add_argument(
+        "--stats", action="store_true", help="summarize the recorded runs (timings, mod counts, cache hit rates)"
+    )
+    parser.add_argument(
+        "--stats-threshold",
+        action="store",
+        type=float,
+        default=25.0,
+        metavar="PERCENT",
+        help="--stats flags stages which are more than PERCENT slower than their median (default: 25)",
+    )
+    parser.add_argument(
+        "--stats-window",
+        action="store",
+        type=int,
+        default=20,
+        metavar="RUNS",
+        help="number of earlier runs --stats takes the median of (default: 20)",
+    )
+    parser.add_argument(
+        "-y",
+        "--yes",
+        action="store_true",
+        help="non interactive: no questions (writes ModsConfig.xml, does not open a browser), no delays, no waiting",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="implies --yes, prints one JSON result document to stdout, all other output goes to stderr",
+    )
 
     # delay options
     parser.add_argument("--wait-error", action="store_true", help="(override) wait on errors")
@@ -117,68 +249,28 @@ def get_args() -> Namespace:
     return parser.parse_args()
 
 
-# functions - cleanup_garbage_name(garbage_name)
-def cleanup_garbage_name(garbage_name: str) -> str:
-    clean = garbage_name
-    regex = re.compile(
-        r"(v|V|)\d+\.\d+(\.\d+|)([a-z]|)|\[(1.0|(A|B)\d+)\]|\((1.0|(A|B)\d+)\)|(for |R|)(1.0|(A|B)\d+)|\.1(8|9)"
-    )
-    clean = re.sub(regex, "", clean)
-    clean = re.sub(regex, "", clean)
-    clean = clean.replace(" - ", ": ").replace(" : ", ": ")
-    #
-    clean = clean.replace("  ", " ")
-    clean = " ".join(clean.split()).strip()
-
-    # cleanup ruined names
-    clean = clean.replace("()", "")
-    clean = clean.replace("[]", "")
-
-    # special cases
-    clean = clean.replace("(v. )", "")  # Sora's RimFantasy: Brutal Start (v. )
-    if clean.endswith(" Ver"):
-        clean = clean.replace(" Ver", "")  # Starship Troopers Arachnids Ver
-    if clean.endswith(" %"):
-        clean = clean.replace(" %", "")  # Tilled Soil (Rebalanced): %
-    if clean.find("[ "):
-        clean = clean.replace("[ ", "[")  # Additional Traits [ Update]
-    if clean.find("( & b19)"):
-        clean = clean.replace("( & b19)", "")  # Barky's Caravan Dogs ( & b19)
-    if clean.find("[19]"):
-        clean = clean.replace("[19]", "")  # Sailor Scouts Hair [19]
-    if clean.find("[/] Version"):
-        clean = clean.replace("[/] Version", "")  # Fueled Smelter [/] Version
-
-    if clean.endswith(":"):
-        clean = clean[:-1]
-    if clean.startswith(": "):
-        clean = clean[2:]  # : ACP: More Floors Wool Patch
-    if clean.startswith("-"):
-        clean = clean[1:]  # -FuelBurning
-
-    clean = clean.strip()
-
-    return clean
-
-
 ######################################################################################################################
 # functions - read in mod data
 #
-# cats       = categories
-# db         = FULL db dict
 # basedir    = mod base directory
 # mod_source  = type of mod installation
+# abouts     = already known About.xml metadata of unchanged mods (mod_id -> metadata), these are not parsed again
+#
+# returns mod_id -> (mod_id, mod_source, mod folder, About.xml metadata)
 #
-def load_mod_data(categories: Dict, db: Dict, basedir: Path, mod_source: str, wait_on_error: bool) -> Dict[str, Tuple]:
+def scan_mod_data(basedir: Path, mod_source: str, wait_on_error: bool, abouts: Dict = None) -> Dict[str, Tuple]:
     mod_details = {}
     folder_list = [x for x in basedir.iterdir()]
     for mod_folder in folder_list:
         about_xml = mod_folder / "About" / "About.xml"
         mod_id = mod_folder.name
-        if about_xml.exists():
+        if abouts and mod_id in abouts:
+            about = abouts[mod_id]
+            name = about["name"]
+        elif about_xml.exists():
             try:
-                xml = ElementTree.parse(about_xml)
-                name = xml.find("name").text
+                about = RWMS.about.read_about(about_xml)
+                name = about["name"]
             except ElementTree.ParseError:
                 print(f"Mod ID is '{mod_id}'")
                 print(f"** error: malformed XML in {about_xml}\n")
@@ -195,55 +287,124 @@ def load_mod_data(categories: Dict, db: Dict, basedir: Path, mod_source: str, wa
                         print("Could not open workshop page. sorry.")
                         continue
                     name = name.replace("Steam Workshop :: ", "")
+                    about = RWMS.about.empty_about(name)
                     print(f"Matching mod ID '{mod_folder}' with '{name}'\n")
                 else:
                     RWMS.error.fatal_error("(cannot do a workaround, no steam installation)", wait_on_error)
                     sys.exit(1)
+        else:
+            print(f"could not find metadata for item {mod_id} (skipping, is probably a scenario)!")
+            continue
 
-            # cleanup name stuff for version garbage
-            name = cleanup_garbage_name(name)
+        mod_details[mod_id] = (mod_id, mod_source, mod_folder, about)
+    return mod_details
 
-            if name in db["db"]:
-                try:
-                    score = categories[db["db"][name]][0]
-                except:
-                    print(f"FIXME: mod '{name}' has an unknown category '{db['db'][name]}'. Stop.")
-                    RWMS.error.fatal_error("please report this error to the database maintainer.", wait_on_error)
-                    sys.exit(1)
 
-                try:
-                    mod_info = (mod_id, float(score), name, mod_source)
+######################################################################################################################
+# functions - look up scanned mods in the database
+#
+# cats       = categories
+# db         = db dict (filtered to the installed mods)
+# identity   = lookup indexes over the db (see RWMS.identity.build_index)
+# scanned    = scanned mods (see scan_mod_data)
+#
+# returns mod_id -> (mod_id, score, cleaned name, mod_source, mod folder, About.xml metadata, resolution tier)
+#
+def load_mod_data(
+    categories: Dict, db: Dict, identity: Dict, scanned: Dict[str, Tuple], wait_on_error: bool
+) -> Dict[str, Tuple]:
+    mod_details = {}
+    for mod_id, mod_source, mod_folder, about in scanned.values():
+        # packageId, then workshop ID, then the name cleaned up from version garbage
+        db_name, tier, name = RWMS.identity.resolve(identity, mod_id, mod_source, about)
 
-                except KeyError:
-                    RWMS.error.fatal_error(
-                        f"could not construct dictionary entry for mod {name}, score {score}", wait_on_error
-                    )
-                    sys.exit(1)
-            else:
-                # note: need the mod source later for distinguishing local vs workshop mod in unknown mod report
-                mod_info = (mod_id, None, name, mod_source)
+        if db_name is not None:
+            try:
+                score = categories[db["db"][db_name]][0]
+            except:
+                print(f"FIXME: mod '{name}' has an unknown category '{db['db'][db_name]}'. Stop.")
+                RWMS.error.fatal_error("please report this error to the database maintainer.", wait_on_error)
+                sys.exit(1)
+
+            try:
+                mod_info = (mod_id, float(score), name, mod_source, mod_folder, about, tier)
 
-            mod_details[mod_id] = mod_info
+            except KeyError:
+                RWMS.error.fatal_error(
+                    f"could not construct dictionary entry for mod {name}, score {score}", wait_on_error
+                )
+                sys.exit(1)
         else:
-            print(f"could not find metadata for item {mod_id} (skipping, is probably a scenario)!")
+            # note: need the mod source later for distinguishing local vs workshop mod in unknown mod report
+            mod_info = (mod_id, None, name, mod_source, mod_folder, about, None)
+
+        mod_details[mod_id] = mod_info
     return mod_details
 
 
-def save_results(mods_config_file: Path, doc):
+def print_resolution(mod_data: Dict[str, Tuple]):
+    print(f"{'Mod ID':<12} {'Resolved by':<12} {'Database name / mod name'}")
+    for mod_id, entry in sorted(mod_data.items(), key=lambda item: (item[1][6] or "~", item[1][2])):
+        print(f"{mod_id[:12]:<12} {entry[6] or 'unknown':<12} {entry[2]}")
+    print("")
+
+
+def print_validation(problems: Dict[str, List], mod_data: Dict[str, Tuple]):
+    def mod_name(mod_id):
+        return mod_data[mod_id][2] if mod_id in mod_data else mod_id
+
+    for mod in problems["not_installed"]:
+        print(f"** active mod '{mod}' is not installed.")
+    for mod_id, package_id, display_name in problems["missing"]:
+        print(f"** '{mod_name(mod_id)}' needs '{display_name or package_id}' ({package_id}), which is not installed.")
+    for mod_id, package_id, display_name in problems["disabled"]:
+        print(f"** '{mod_name(mod_id)}' needs '{display_name or package_id}' ({package_id}), which is not active.")
+    for mod_a, mod_b in problems["incompatible"]:
+        print(f"** '{mod_name(mod_a)}' and '{mod_name(mod_b)}' are incompatible with each other.")
+
+
+def is_official_mod(mod_entry: Tuple) -> bool:
+    return mod_entry[0] == "Core" or mod_entry[5]["packageId"].startswith(RWMS.validation.official_prefix)
+
+
+def print_conflicts(conflicts: List[Dict], mod_data: Dict[str, Tuple]):
+    if not conflicts:
+        print("no conflicting Defs or Patches found.\n")
+        return
+    print(f"{len(conflicts)} pairs of mods touch the same Defs:")
+    for conflict in conflicts:
+        mod_a, mod_b = (mod_data[mod][2] for mod in conflict["mods"])
+        defs = conflict["defs"]
+        shown = ", ".join(defs[:5]) + (f" and {len(defs) - 5} more" if len(defs) > 5 else "")
+        print(f"- {mod_a} / {mod_b}: {len(defs)} {conflict['kind']}(s), winner {mod_data[conflict['winner']][2]}")
+        print(f"    {shown}")
+    print("")
+
+
+def print_footprint(footprints: Dict[str, Dict[str, int]], mod_data: Dict[str, Tuple], sort_key: str):
+    human_size = RWMS.footprint.human_size
+    print(f"{'Mod':<40} {'Size':>10} {'Textures':>9} {'Tex size':>10} {'Defs':>10} {'DLLs':>5} {'Patches':>8}")
+    for mod, fp in sorted(footprints.items(), key=lambda item: item[1][sort_key], reverse=True):
+        print(
+            f"{mod_data[mod][2][:40]:<40} {human_size(fp['bytes']):>10} {fp['textures']:>9} "
+            f"{human_size(fp['texture_bytes']):>10} {human_size(fp['defs_bytes']):>10} {fp['assemblies']:>5} "
+            f"{fp['patches']:>8}"
+        )
+    total = sum(fp["bytes"] for fp in footprints.values())
+    print(f"{len(footprints)} active mods, {human_size(total)} in total.\n")
+
+
+def save_results(mods_config_file: Path, mods_config_raw: bytes, active_mods: List[str]):
     now = time.strftime("%Y%m%d-%H%M", time.localtime(time.time()))
     backup_file = mods_config_file.with_suffix(f".backup-{now}.xml")
-    shutil.copy(str(mods_config_file), str(backup_file))
+    with open(str(backup_file), "wb") as f:
+        f.write(mods_config_raw)
     print(f"Backed up ModsConfig.xml to {backup_file}.")
 
     print("Writing new ModsConfig.xml.")
-    mods_config_str = ElementTree.tostring(doc.getroot(), encoding="unicode")
-    with open(str(mods_config_file), "w", encoding="utf-8-sig", newline="\n") as f:
-        # poor man's pretty print
-        f.write('<?xml version="1.0" encoding="utf-8"?>\n')
-        mods_config_str = mods_config_str.replace("</li><li>", "</li>\n    <li>").replace(
-            "</li></activeMods>", "</li>\n  </activeMods>"
-        )
-        f.write(mods_config_str)
+    RWMS.modsconfig.write_modsconfig(
+        mods_config_file, RWMS.modsconfig.replace_active_mods(mods_config_raw, active_mods)
+    )
 
 
 def print_contributors(database: Dict):
@@ -256,17 +417,25 @@ def print_contributors(database: Dict):
     print("https://bitbucket.org/shakeyourbunny/rwmsdb/src/master/CONTRIBUTING.md")
 
 
-def main():
+######################################################################################################################
+# sorting run
+#
+# args       = command line arguments
+# result     = filled with the result of the run (order, unknown mods, timings etc.), see main() for --json
+#
+def sort_mods(args: Namespace, result: Dict):
     # ##################################################################################
     # some basic initialization and default output
-    twx, twy = shutil.get_terminal_size()
+    timings = result.setdefault("timings", dict())
+    run_start = stage_start = time.perf_counter()
 
-    banner = f"** RWMS {VERSION} by shakeyourbunny"
-    print(f"{banner:*<{twx}}")
-    print("bugs: https://bitbucket.org/shakeyourbunny/rwms/issues")
-    print("database updates: visit https://bitbucket.org/shakeyourbunny/rwmsdb/issues\n")
+    if not args.json:
+        twx, twy = shutil.get_terminal_size()
 
-    args = get_args()
+        banner = f"** RWMS {VERSION} by shakeyourbunny"
+        print(f"{banner:*<{twx}}")
+        print("bugs: https://bitbucket.org/shakeyourbunny/rwms/issues")
+        print("database updates: visit https://bitbucket.org/shakeyourbunny/rwmsdb/issues\n")
 
     update_check = RWMS.configuration.load_value("rwms", "updatecheck", True)
     open_browser = RWMS.configuration.load_value("rwms", "openbrowser", True)
@@ -301,6 +470,16 @@ def main():
     if args.disable_tweaks:
         disable_tweaks = True
 
+    # non interactive mode
+    if args.json:
+        args.yes = True
+
+    if args.yes:
+        wait_on_error = False
+        wait_on_exit = False
+        enable_delays = False
+        open_browser = False
+
     # directory overrides
     if args.steamdir:
         disable_steam = False
@@ -335,47 +514,35 @@ def main():
 
     # start script
     if update_check:
-        if RWMS.update.is_update_available(VERSION):
-            print(f"*** Update available, new version is {RWMS.update.__load_version_from_repo()} ***\n")
+        if RWMS.update.is_update_available(VERSION, wait_on_error):
+            print(f"*** Update available, new version is {RWMS.update.__load_version_from_repo(wait_on_error)} ***\n")
             print("Release: https://bitbucket.org/shakeyourbunny/rwms/downloads/")
             if open_browser:
                 webbrowser.open_new("https://bitbucket.org/shakeyourbunny/rwms/downloads/")
 
     if RWMS.configuration.detect_rimworld() == "":
         RWMS.error.fatal_error("no valid RimWorld installation detected!", wait_on_error)
-        wait_for_exit(0, wait_on_error)
+        wait_for_exit(1, wait_on_error)
 
-    categories_url = (
-        "https://api.bitbucket.org/2.0/repositories/shakeyourbunny/rwmsdb/src/master/rwms_db_categories.json"
-    )
-    database_url = "https://api.bitbucket.org/2.0/repositories/shakeyourbunny/rwmsdb/src/master/rwmsdb.json"
+    categories_url, database_url = RWMS.database.database_urls()
 
     ####################################################################################################################
     # real start of the script
 
     # load scoring mapping dict
-    categories = RWMS.database.download_database(categories_url)
+    categories = RWMS.database.download_database(categories_url, wait_on_error)
     if not categories:
         RWMS.error.fatal_error("Could not load properly categories.", wait_on_error)
         wait_for_exit(1, wait_on_error)
-
-    # preload all needed data
-    # categories
-    database = RWMS.database.download_database(database_url)
-    if not database:
-        RWMS.error.fatal_error(f"Error loading scoring database {database_url}.", wait_on_error)
-        wait_for_exit(1, wait_on_error)
-    else:
-        print(f"\nDatabase (v{database['version']}, date: {database['timestamp']}) successfully loaded.")
-        print(f'{len(database["db"])} known mods, {len(database["contributor"])} contributors.')
+    stage_start = stage_done(timings, "categories", stage_start)
 
     if args.contributors:
+        database = RWMS.database.download_database(database_url, wait_on_error)
+        if not database:
+            RWMS.error.fatal_error(f"Error loading scoring database {database_url}.", wait_on_error)
+            wait_for_exit(1, wait_on_error)
         print_contributors(database)
         wait_for_exit(0, wait_on_exit)
-    else:
-        contributors = collections.Counter(database["contributor"])
-        most_common = [f"{c[0]} ({c[1]})" for c in contributors.most_common(5)]
-        print(f"Top contributors: {', '.join(most_common)}\n")
 
     mods_config_file = RWMS.configuration.modsconfigfile()
     print("Loading and parsing ModsConfig.xml")
@@ -384,20 +551,31 @@ def main():
         wait_for_exit(1, wait_on_error)
 
     try:
-        xml = ElementTree.parse(mods_config_file)
+        mods_config_raw, mods_config = RWMS.modsconfig.read_modsconfig(mods_config_file)
+        mods_config_list = RWMS.modsconfig.active_mods(mods_config)
     except:
         RWMS.error.fatal_error("could not parse XML from ModsConfig.xml.", wait_on_error)
         wait_for_exit(1, wait_on_error)
 
-    xml = xml.find("activeMods")
-    mods_enabled_list = [t.text for t in xml.findall("li")]
-    if "Core" not in mods_enabled_list:
-        mods_enabled_list.append("Core")
+    # the mod list to sort, either the active mods or the mods of a savegame
+    mods_active_list = mods_config_list
+    if args.from_save:
+        save_file = RWMS.savegame.find_savegame(args.from_save)
+        print(f"Loading mod list from savegame {save_file}")
+        try:
+            save_meta = RWMS.savegame.read_savegame_meta(save_file)
+        except (OSError, ElementTree.ParseError) as e:
+            RWMS.error.fatal_error(f"could not read mod list from savegame '{save_file}': {e}", wait_on_error)
+            wait_for_exit(1, wait_on_error)
+        if not save_meta["modIds"]:
+            RWMS.error.fatal_error(f"savegame '{save_file}' has no mod list.", wait_on_error)
+            wait_for_exit(1, wait_on_error)
+        mods_active_list = save_meta["modIds"]
+        print(f"Savegame was made with RimWorld {save_meta['gameVersion']} and {len(mods_active_list)} mods.")
 
-    # check auf unknown mods
-    print("Loading mod data.")
-    mod_data_workshop = dict()
+    stage_start = stage_done(timings, "modsconfig", stage_start)
 
+    steam_workshop_dir = None
     if not disable_steam:
         steam_workshop_dir = RWMS.configuration.detect_steamworkshop_dir()
         if steam_workshop_dir is not None:
@@ -408,7 +586,6 @@ def main():
                     wait_on_error,
                 )
                 wait_for_exit(1, wait_on_error)
-            mod_data_workshop = load_mod_data(categories, database, steam_workshop_dir, "W", wait_on_error)
 
     local_mod_dir = RWMS.configuration.detect_localmods_dir()
     if not local_mod_dir.is_dir():
@@ -418,9 +595,88 @@ def main():
             wait_on_error,
         )
         wait_for_exit(1, wait_on_error)
-    mod_data_local = load_mod_data(categories, database, local_mod_dir, "L", wait_on_error)
+
+    workshop_stamps = dict()
+    if steam_workshop_dir is not None:
+        workshop_stamps = RWMS.workshop.item_stamps(steam_workshop_dir)
+
+    # fast path: nothing changed since the last sorted run, checked before any mod or the database is read
+    memo_tweaks = RWMS.memo.tweak_set(RWMS.configuration.tweaks_dir(), disable_tweaks)
+    memo_generation = RWMS.memo.mod_generation((local_mod_dir,), workshop_stamps)
+    memo_options = (VERSION, dont_remove_unknown)
+    database_stamp = RWMS.database.download_stamp(database_url)
+    skip_memo = (args.force, args.reset_to_core, args.check, args.from_save, args.conflicts, args.footprint)
+    if database_stamp is not None and not any(skip_memo + (args.footprint_json, args.resolution_report)):
+        memo_key = RWMS.memo.fingerprint(
+            mods_config_list, database_stamp, categories, memo_tweaks, memo_generation, *memo_options
+        )
+        if RWMS.memo.lookup(memo_key) == mods_config_list:
+            memo_ms = (time.perf_counter() - run_start) * 1000
+            print(f"ModsConfig.xml is already sorted, inputs unchanged since last run ({memo_ms:.0f} ms).")
+            print("(use --force to sort anyway)")
+            stage_done(timings, "memo", stage_start)
+            result.update(order=mods_config_list, changed=False, written=False, memo_hit=True)
+            wait_for_exit(0, wait_on_exit)
+    result["memo_hit"] = False
+    stage_start = stage_done(timings, "memo", stage_start)
+
+    # check auf unknown mods
+    print("Loading mod data.")
+    scanned_workshop = dict()
+    if steam_workshop_dir is not None:
+        # only workshop mods which changed since the last run are parsed again
+        workshop_abouts = RWMS.workshop.cached_abouts(workshop_stamps)
+        scanned_workshop = scan_mod_data(steam_workshop_dir, "W", wait_on_error, workshop_abouts)
+        RWMS.workshop.store_abouts(workshop_stamps, {mod: entry[3] for mod, entry in scanned_workshop.items()})
+
+    scanned_local = scan_mod_data(local_mod_dir, "L", wait_on_error)
+    stage_start = stage_done(timings, "scan", stage_start)
+
+    # only the database entries of installed mods are kept
+    database = RWMS.database.stream_database(
+        database_url,
+        RWMS.identity.database_filters({**scanned_local, **scanned_workshop}),
+        wait_on_error,
+        RWMS.identity.database_references,
+    )
+    if not database:
+        RWMS.error.fatal_error(f"Error loading scoring database {database_url}.", wait_on_error)
+        wait_for_exit(1, wait_on_error)
+    else:
+        print(f"\nDatabase (v{database['version']}, date: {database['timestamp']}) successfully loaded.")
+        print(f'{database["db_entries"]} known mods, {len(database["contributor"])} contributors.')
+        contributors = collections.Counter(database["contributor"])
+        most_common = [f"{c[0]} ({c[1]})" for c in contributors.most_common(5)]
+        print(f"Top contributors: {', '.join(most_common)}\n")
+        result["database"] = {
+            "version": database["version"],
+            "timestamp": database["timestamp"],
+            "entries": database["db_entries"],
+        }
+    stage_start = stage_done(timings, "database", stage_start)
+
+    identity = RWMS.identity.build_index(database)
+    mod_data_workshop = load_mod_data(categories, database, identity, scanned_workshop, wait_on_error)
+    mod_data_local = load_mod_data(categories, database, identity, scanned_local, wait_on_error)
 
     mod_data_full = {**mod_data_local, **mod_data_workshop}
+    RWMS.identity.learn(identity, mod_data_full)
+
+    if args.from_save:
+        # savegames of RimWorld 1.1 and later list packageIds, installed mods are known by their folder
+        mods_active_list = RWMS.validation.installed_mod_ids(mods_active_list, mod_data_full)
+    mods_enabled_list = list(mods_active_list)
+    if "Core" not in mods_enabled_list:
+        mods_enabled_list.append("Core")
+
+    resolved = collections.Counter(entry[6] for entry in mod_data_full.values())
+    print(
+        f"Resolved {resolved['packageid']} mods by packageId, {resolved['workshopid']} by workshop ID, "
+        f"{resolved['learned']} by learned IDs, {resolved['name']} by name, {resolved[None]} unknown."
+    )
+    if args.resolution_report:
+        print_resolution(mod_data_full)
+    stage_start = stage_done(timings, "resolve", stage_start)
     mod_data_known = {}  # all found known mods, regardless of their active status
     mod_data_unknown = {}  # all found unknown mods, regardless of their active status
     for mods, mod_entry in mod_data_full.items():
@@ -440,43 +696,65 @@ def main():
             print(f"Unknown ACTIVE mod ID {mods} found..")
             mods_unknown_active.append(mods)
 
+    rimworld_version = RWMS.modsconfig.rimworld_version(mods_config)
+
+    print("Checking dependencies and incompatibilities of active mods.")
+    problems = RWMS.validation.check_active_mods(mods_active_list, mod_data_full, rimworld_version)
+    if RWMS.validation.has_problems(problems):
+        print_validation(problems, mod_data_full)
+        print("")
+    else:
+        print("no missing dependencies or incompatibilities found.")
+    result["problems"] = problems
+    stage_start = stage_done(timings, "validate", stage_start)
+    if args.check:
+        wait_for_exit(2 if RWMS.validation.has_problems(problems) else 0, wait_on_exit)
+
     print("Sorting mods.\n")
     be_sleepy(1.0, enable_delays)
-    new_list = sorted(mods_data_active, key=itemgetter(1))
+    # unknown mods which are kept are placed by an inferred score where possible
+    mods_inferred = dict()
+    if dont_remove_unknown and mods_unknown_active:
+        mods_inferred = RWMS.inference.infer_scores(
+            [mods for mods in mods_unknown_active if mods in mod_data_full], mod_data_full, rimworld_version
+        )
+    new_list = sorted(mods_data_active + [(mods, entry[0]) for mods, entry in mods_inferred.items()], key=itemgetter(1))
     print(
         f"{len(mod_data_full)} subscribed mods, {len(mods_enabled_list)} ({len(mods_data_active) + 1} known,"
         f" {len(mods_unknown_active)} unknown) enabled mods"
     )
     be_sleepy(2.0, enable_delays)
-
-    doc = ElementTree.parse(mods_config_file)
-    xml = doc.getroot()
-
-    try:
-        rimworld_version = xml.find("version").text
-    except:
-        try:
-            rimworld_version = xml.find("buildNumber").text
-        except:
-            rimworld_version = "unknown"
-
-    xml = xml.find("activeMods")
-    for li in xml.findall("li"):
-        xml.remove(li)
+    result["counts"] = {
+        "subscribed": len(mod_data_full),
+        "active": len(mods_enabled_list),
+        "known_active": len(mods_data_active),
+        "unknown_active": len(mods_unknown_active),
+        "unknown_inferred": len(mods_inferred),
+        "unknown_installed": len(mod_data_unknown),
+    }
+    result["unknown"] = [
+        {
+            "mod_id": mods,
+            "name": mod_entry[2],
+            "active": mods in mods_unknown_active,
+            "score": mods_inferred[mods][0] if mods in mods_inferred else None,
+            "reason": mods_inferred[mods][1] if mods in mods_inferred else None,
+        }
+        for mods, mod_entry in mod_data_unknown.items()
+    ]
+    stage_start = stage_done(timings, "sort", stage_start)
+
+    final_list = list()
 
     now_time = time.strftime("%Y%m%d-%H%M", time.localtime(time.time()))
 
     write_mods_config = False
+    submission = None
 
     if args.reset_to_core:
-        while True:
-            data = input("Do you want to reset your mod list to Core only (y/n)? ")
-            if data.lower() in ("y", "n"):
-                break
-        if data.lower() == "y":
+        if ask_yes_no("Do you want to reset your mod list to Core only (y/n)? ", True if args.yes else None):
             print("Resetting your ModsConfig.xml to Core only!")
-            xml_sorted = ElementTree.SubElement(xml, "li")
-            xml_sorted.text = "Core"
+            final_list.append("Core")
             write_mods_config = True
     else:
         # handle known active mods
@@ -484,18 +762,22 @@ def main():
             if mods[0] == "":
                 print("skipping, empty?")
             else:
-                xml_sorted = ElementTree.SubElement(xml, "li")
-                xml_sorted.text = str(mods[0])
+                final_list.append(str(mods[0]))
 
         # handle unknown active mods if dont-remove-unknown-mods enabled
         if dont_remove_unknown and mods_unknown_active:
-            print("Adding in unknown mods in the load order (at the bottom).")
-            for mods in mods_unknown_active:
+            if mods_inferred:
+                print(f"Placed {len(mods_inferred)} unknown mods by an inferred score:")
+                for mods, (score, reason) in mods_inferred.items():
+                    print(f"  {mod_data_full[mods][2]}: {score:g} ({reason})")
+            mods_unplaced = [mods for mods in mods_unknown_active if mods not in mods_inferred]
+            if mods_unplaced:
+                print("Adding in unknown mods in the load order (at the bottom).")
+            for mods in mods_unplaced:
                 if mods == "":
                     print("skipping, empty?")
                 else:
-                    xml_sorted = ElementTree.SubElement(xml, "li")
-                    xml_sorted.text = str(mods)
+                    final_list.append(str(mods))
 
         # generate unknown mod report for all found unknown mods, regardless of their active status
         if mod_data_unknown:
@@ -514,6 +796,7 @@ def main():
             DB["meta"] = unknown_meta
 
             unknown_diff = dict()
+            unknown_queue = list()
             for mod_entry in mod_data_unknown.values():
                 if mod_entry[3] == "L":
                     # not printing actual path for security/privacy
@@ -523,21 +806,24 @@ def main():
                 else:
                     mod_loc = ""
                 unknown_diff[mod_entry[2]] = ("not_categorized", mod_loc)
+                unknown_queue.append((mod_entry[2], mod_entry[0], mod_loc))
             DB["unknown"] = unknown_diff
 
-            unknownfile = f"rwms_unknown_mods_{now_time}.json.txt"
-            print("Writing unknown mods report.\n")
-            with open(unknownfile, "w", encoding="UTF-8", newline="\n") as f:
-                json.dump(DB, f, indent=True, sort_keys=True)
-
+            # unknown mods which were already reported on an earlier run do not need a new report
+            unknown_new = RWMS.issue_mgmt.enqueue_unknown(unknown_queue, unknown_meta)
+            if unknown_new == 0:
+                print(f"All {len(mod_data_unknown)} unknown mods were already reported on an earlier run.")
             if RWMS.issue_mgmt.is_github_configured():
-                print("For now, due to GitHub issues by itself, disabled. IGNORED.\n")
-                print("Please visit https://bitbucket.org/shakeyourbunny/rwmsdb/issues")
-                # print("Creating a new issue on the RWMSDB issue tracker.")
-                # with open(unknownfile, 'r', encoding="UTF-8") as f:
-                #     issuebody = f.read()
-                # RWMS.issue_mgmt.create_issue('unknown mods found by ' + RWMS.issue_mgmt.get_github_user(), issuebody)
-            else:
+                if unknown_new:
+                    print(f"Submitting {unknown_new} newly found unknown mods to the RWMSDB issue tracker.")
+                # also retries submissions of earlier runs which were rate limited
+                submission = RWMS.issue_mgmt.start_submission()
+            elif unknown_new:
+                unknownfile = f"rwms_unknown_mods_{now_time}.json.txt"
+                print("Writing unknown mods report.\n")
+                with open(unknownfile, "w", encoding="UTF-8", newline="\n") as f:
+                    json.dump(DB, f, indent=True, sort_keys=True)
+
                 print(
                     textwrap.fill(
                         "For the full list of unknown mods see the written data file in the current "
@@ -548,42 +834,130 @@ def main():
                 )
                 print(f"\nData file name is {unknownfile}\n")
 
-                while True:
-                    data = input("Do you want to open the RWMSDB issues web page in your default browser (y/n): ")
-                    if data.lower() in ("y", "n"):
-                        break
-                if data.lower() == "y":
+                if ask_yes_no(
+                    "Do you want to open the RWMSDB issues web page in your default browser (y/n): ",
+                    False if args.yes else None,
+                ):
                     print("Trying to open the default webbrowser for RWMSDB issues page.\n")
                     webbrowser.open_new("https://bitbucket.org/shakeyourbunny/rwmsdb/issues")
 
             if dont_remove_unknown:
-                print("Unknown, ACTIVE mods will be written at the end of the mod list.")
+                print("Unknown, ACTIVE mods without inferred score will be written at the end of the mod list.")
             else:
                 print("Unknown, ACTIVE mods will be removed.")
         else:
             print("lucky, no unknown mods detected!")
+        stage_start = stage_done(timings, "unknown_report", stage_start)
+
+        if args.conflicts:
+            print("\nChecking active mods for conflicting Defs and Patches.")
+            conflict_mods = {
+                mod: mod_data_full[mod][4]
+                for mod in final_list
+                if mod in mod_data_full and not is_official_mod(mod_data_full[mod])
+            }
+            conflict_scans = RWMS.defs.scan_mods(conflict_mods, rimworld_version)
+            print_conflicts(RWMS.defs.find_conflicts(final_list, conflict_scans), mod_data_full)
+            stage_start = stage_done(timings, "conflicts", stage_start)
+
+        if args.footprint or args.footprint_json:
+            print("\nEstimating load cost of active mods.")
+            footprint_mods = {mod: mod_data_full[mod][4] for mod in final_list if mod in mod_data_full}
+            # stamps from the workshop manifest change with every update of a mod, the others only with About.xml
+            manifest_stamps = {mod: stamp for mod, stamp in workshop_stamps.items() if stamp.startswith("m:")}
+            footprints = RWMS.footprint.footprints(footprint_mods, manifest_stamps)
+            if args.footprint:
+                print_footprint(footprints, mod_data_full, args.footprint_sort)
+            if args.footprint_json:
+                with open(args.footprint_json, "w", encoding="UTF-8", newline="\n") as f:
+                    json.dump(
+                        {mod: {"name": mod_data_full[mod][2], **fp} for mod, fp in footprints.items()},
+                        f,
+                        indent=True,
+                        sort_keys=True,
+                    )
+                print(f"Footprint data written to {args.footprint_json}.\n")
+            stage_start = stage_done(timings, "footprint", stage_start)
 
         if args.dry_run:
-            print_dry_run(mods_config_file, doc, mod_data_full)
+            print_dry_run(mods_active_list, final_list, mod_data_full)
             write_mods_config = False
-
-        # ask for confirmation to write the ModsConfig.xml anyway
-        while True and not args.dry_run:
-            data = input("Do you REALLY want to write ModsConfig.xml (y/n): ")
-            if data.lower() in ("y", "n"):
-                break
-        if data.lower() == "y":
-            write_mods_config = True
+        else:
+            # ask for confirmation to write the ModsConfig.xml anyway
+            if ask_yes_no("Do you REALLY want to write ModsConfig.xml (y/n): ", True if args.yes else None):
+                write_mods_config = True
 
     if write_mods_config:
         # do backup
-        save_results(mods_config_file, doc)
+        save_results(mods_config_file, mods_config_raw, final_list)
         print("Writing done.")
     else:
         print("ModsConfig.xml was NOT modified.")
+    stage_done(timings, "write", stage_start)
+    result.update(order=final_list, changed=final_list != mods_config_list, written=write_mods_config)
+
+    # remember the sorted state, the next run with unchanged inputs can skip everything
+    if database_stamp is not None and not args.reset_to_core and (write_mods_config or final_list == mods_config_list):
+        memo_key = RWMS.memo.fingerprint(
+            final_list, database_stamp, categories, memo_tweaks, memo_generation, *memo_options
+        )
+        RWMS.memo.store(memo_key, final_list)
+
+    if submission is not None:
+        submission.join()
 
     wait_for_exit(0, wait_on_exit)
 
 
+def main():
+    args = get_args()
+    if args.serve_db:
+        RWMS.mirror.serve(args.serve_address, args.serve_interval)
+        sys.exit(0)
+
+    if args.stats:
+        summary = RWMS.metrics.summarize(RWMS.metrics.load_runs(), args.stats_threshold, args.stats_window)
+        if args.json:
+            json.dump(summary, sys.stdout, indent=True, sort_keys=True)
+            print("")
+        else:
+            RWMS.metrics.print_stats(summary, args.stats_threshold)
+        sys.exit(0)
+
+    # JSON mode: stdout only gets the result document
+    # exit codes: 0 = ok, 1 = fatal error, 2 = --check found problems
+    result = {"rwms_version": VERSION}
+    exit_code = 0
+    with contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext():
+        try:
+            sort_mods(args, result)
+        except SystemExit as e:
+            exit_code = e.code or 0
+        except Exception as e:
+            if not args.json:
+                raise
+            # scripts always get a result document, the traceback goes to stderr
+            traceback.print_exc()
+            # keep the error which led to a prompt (EOFError)
+            if RWMS.error.last_error is None:
+                if isinstance(e, EOFError):
+                    RWMS.error.last_error = "interactive input requested in non interactive mode"
+                else:
+                    RWMS.error.last_error = f"{type(e).__name__}: {e}"
+            exit_code = 1
+    result["exit_code"] = exit_code
+    result["error"] = RWMS.error.last_error
+    result["cache"] = RWMS.metrics.cache_stats()
+    # runs which did not get to the mods (configuration dump etc.) are not recorded
+    if result["timings"]:
+        RWMS.metrics.append_run(result)
+    if args.json:
+        json.dump(result, sys.stdout, indent=True, sort_keys=True)
+        print("")
+    sys.exit(exit_code)
+
+
 if __name__ == "__main__":
+    # needed for the process pool in a frozen (pyinstaller) executable
+    multiprocessing.freeze_support()
     main()